@@ -9,7 +9,14 @@ added_files = [
     ('credentials.json', '.'),
     ('tabs/*.py', 'tabs'),
     ('google_api.py', '.'),
+    ('sheets_service.py', '.'),
+    ('sheet_snapshot.py', '.'),
+    ('inn_index.py', '.'),
     ('scraper.py', '.'),
+    ('resource_blocking.py', '.'),
+    ('parser_checkpoint.py', '.'),
+    ('metrics_history.py', '.'),
+    ('parser_pipeline.py', '.'),
     ('unified_app.py', '.'),
 ]
 
@@ -32,14 +39,15 @@ hidden_imports = [
     'gspread',
     'google.oauth2.service_account',
     'google.auth',
-    'oauth2client',
-    'oauth2client.service_account',
+    'google.auth.transport.requests',
     'requests',
     'pandas',
     'openai',
     'pymorphy2',
     'bs4',
     'lxml',
+    'psutil',
+    'sqlite3',
 ]
 
 a = Analysis(
@@ -1,44 +1,125 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import os
+import re
+import json
+import time
+import threading
+from pathlib import Path
+
+from sheets_service import get_service
+from inn_index import get_inn_index, normalize_inn
+
+try:
+    import psutil
+except ImportError:
+    # Без psutil журнал другого процесса подхватывается только по давности
+    psutil = None
+
+
+# Журналы ещё не отправленных записей буфера: свой файл на таблицу и процесс
+# (<spreadsheet_id>.<pid>.jsonl, JSON Lines, строка журнала = строка таблицы)
+WRITE_JOURNAL_DIR = "sheets_write_journal"
+# Журнал другого процесса забирается, если процесса уже нет
+# или файл не менялся столько секунд
+ORPHAN_JOURNAL_SECONDS = 3600
+# Общий журнал старых версий: без id таблицы, поэтому не досылается
+LEGACY_JOURNAL_FILE = "sheets_write_journal.jsonl"
+# Отправлять накопленное каждые N строк или T секунд
+WRITE_BATCH_ROWS = 20
+WRITE_BATCH_SECONDS = 15
+# Колонки, которые читаются перед записью: метрики E:H и подкрепы K
+ROW_VALUE_COLUMNS = (("E", "H"), ("K", "K"))
+# Диапазонов в одном values.batchGet (ограничение на длину URL)
+MAX_RANGES_PER_REQUEST = 100
+
+
+def a1_range(sheet_name, cells):
+    """'1кк', 'G5' → "'1кк'!G5" (имя листа в кавычках)"""
+    return "'{}'!{}".format(sheet_name.replace("'", "''"), cells)
+
+
+def parse_a1_cell(a1):
+    """"'1кк'!G5" → ('1кк', 5)"""
+    sheet, cell = a1.rsplit("!", 1)
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+    return sheet, int(re.sub(r"\D", "", cell))
+
+
+def cell_text(value):
+    """Значение ячейки строкой; 7701234567.0 → '7701234567'"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def row_runs(rows):
+    """[2, 3, 4, 9] → [(2, 4), (9, 9)] — непрерывные участки строк"""
+    runs = []
+    for row in sorted(set(rows)):
+        if runs and row == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
 
 
 class GoogleSheetsAPI:
     def __init__(self, creds_file, spreadsheet_id):
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive.file",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            creds_file, scope
-        )
-        self.client = gspread.authorize(creds)
-        self.spreadsheet = self.client.open_by_key(spreadsheet_id)
+        # Клиент и листы — общие на процесс (sheets_service)
+        self.creds_file = creds_file
+        self.service = get_service(creds_file)
+        self.client = self.service.client
+        self.spreadsheet_id = spreadsheet_id
+
+    @property
+    def spreadsheet(self):
+        # Открывается при первом обращении (запрос метаданных), дальше из кэша
+        return self.service.spreadsheet(self.spreadsheet_id)
 
     def get_sheet(self, sheet_name):
-        return self.spreadsheet.worksheet(sheet_name)
+        return self.service.worksheet(self.spreadsheet_id, sheet_name)
 
     def get_sheet_names(self):
-        return [ws.title for ws in self.spreadsheet.worksheets()]
+        return self.service.worksheet_titles(self.spreadsheet_id)
+
+    def refresh(self):
+        """Перечитать список листов при следующем обращении"""
+        self.service.invalidate(self.spreadsheet_id)
 
-    def get_inn_id_mapping(self):
+    def revision(self):
+        return self.service.revision(self.spreadsheet_id)
+
+    def get_sheets_values(self, sheet_names, cells=None):
         """
-        Лист "Айди":
-        A — ИНН
-        B — user_flow_id
+        Значения нескольких листов одним values.batchGet: {лист: строки}.
+        cells — диапазон внутри листа ("A2:A"), чтобы не качать лишние колонки;
+        None — лист целиком.
         """
-        ws = self.spreadsheet.worksheet("Айди")
-        data = ws.get_all_values()
-        mapping = {}
-        for row in data[1:]:
-            if len(row) < 2:
-                continue
-            inn = (row[0] or "").strip()
-            user_flow_id = (row[1] or "").strip()
-            if inn and user_flow_id:
-                mapping[inn] = user_flow_id
-        return mapping
+        if not sheet_names:
+            return {}
+        resp = self.spreadsheet.values_batch_get(
+            [
+                a1_range(name, cells) if cells else "'{}'".format(name.replace("'", "''"))
+                for name in sheet_names
+            ]
+        )
+        return {
+            name: vr.get("values", [])
+            for name, vr in zip(sheet_names, resp.get("valueRanges", []))
+        }
+
+    def get_inn_id_mapping(self, fresh=False):
+        """
+        Лист "Айди" (A — ИНН, B — user_flow_id) как общий индекс
+        InnIndex: get / in / [] как у словаря, ИНН нормализуются.
+        Лист читается один раз на процесс и обновляется в фоне;
+        fresh — перечитать сейчас (перед запуском задания, чтобы
+        только что добавленные строки маппинга были видны).
+        """
+        index = get_inn_index(self.creds_file, self.spreadsheet_id)
+        return index.load() if fresh else index.index()
 
     def update_row_metrics(
         self,
@@ -59,14 +140,17 @@ class GoogleSheetsAPI:
         H — "Контактов Himera Finance | Старых без отложки", например "142 | 97"
         """
         ws = self.get_sheet(sheet_name)
+        values = self.row_metrics_values(total, rich, filtered, himera_finance, old_without_delay)
+        ws.update(f"E{row}:H{row}", [values])
 
+    @staticmethod
+    def row_metrics_values(total, rich, filtered, himera_finance, old_without_delay):
+        """Значения E:H одной строки"""
         if himera_finance is not None and old_without_delay is not None:
             h_value = f"{himera_finance} | {old_without_delay}"
         else:
             h_value = ""
-
-        values = [total, rich, filtered, h_value]
-        ws.update(f"E{row}:H{row}", [values])
+        return [total, rich, filtered, h_value]
 
     def update_supports(self, sheet_name, row, text: str):
         """
@@ -74,3 +158,297 @@ class GoogleSheetsAPI:
         """
         ws = self.get_sheet(sheet_name)
         ws.update(f"K{row}", [[text]])
+
+    def get_inn_rows(self, sheet_names):
+        """
+        Где встречается каждый ИНН на листах (колонка A), одним запросом:
+        {лист: {ИНН: [номера строк]}}
+        """
+        if not sheet_names:
+            return {}
+        resp = self.spreadsheet.values_batch_get(
+            [a1_range(name, "A:A") for name in sheet_names]
+        )
+        result = {}
+        for name, vr in zip(sheet_names, resp.get("valueRanges", [])):
+            rows = {}
+            for idx, row in enumerate(vr.get("values", []), start=1):
+                if idx == 1 or not row:  # Пропускаем заголовок
+                    continue
+                inn = (row[0] or "").strip()
+                if inn:
+                    rows.setdefault(inn, []).append(idx)
+            result[name] = rows
+        return result
+
+    def get_rows_cells(self, sheet_name, rows, columns):
+        """
+        Ячейки выбранных строк листа: по диапазону на каждый непрерывный
+        участок строк и каждую пару колонок из columns ((первая, последняя)),
+        всё одним values.batchGet. Строки между участками не скачиваются.
+        {строка: {колонка: значение}}; числа приходят числами, без форматирования.
+        """
+        rows = sorted(set(rows))
+        result = {row: {} for row in rows}
+        blocks = [
+            (top, bottom, first, last)
+            for top, bottom in row_runs(rows)
+            for first, last in columns
+        ]
+        for start in range(0, len(blocks), MAX_RANGES_PER_REQUEST):
+            chunk = blocks[start:start + MAX_RANGES_PER_REQUEST]
+            resp = self.spreadsheet.values_batch_get(
+                [a1_range(sheet_name, f"{first}{top}:{last}{bottom}") for top, bottom, first, last in chunk],
+                params={"valueRenderOption": "UNFORMATTED_VALUE"},
+            )
+            value_ranges = resp.get("valueRanges", [])
+            for i, (top, bottom, first, last) in enumerate(chunk):
+                values = value_ranges[i].get("values", []) if i < len(value_ranges) else []
+                cols = [chr(c) for c in range(ord(first), ord(last) + 1)]
+                for row in range(top, bottom + 1):
+                    current = values[row - top] if row - top < len(values) else []
+                    for col, value in zip(cols, list(current) + [""] * len(cols)):
+                        result[row][col] = value
+        return result
+
+    def get_rows_values(self, sheet_name, rows):
+        """
+        Текущие E:H и K строк листа: {строка: [E, F, G, H, "", "", K]}.
+        I:J не скачиваются (там лишние данные), но позиции как у E:K,
+        чтобы индекс колонки считался от E.
+        """
+        cells = self.get_rows_cells(sheet_name, rows, ROW_VALUE_COLUMNS)
+        return {
+            row: [values.get(col, "") for col in "EFGHIJK"]
+            for row, values in cells.items()
+        }
+
+    def batch_update_values(self, data):
+        """
+        Несколько диапазонов (на любых листах) одним values.batchUpdate.
+        data — [{"range": "'лист'!E5:H5", "values": [[...]]}, ...]
+        """
+        if not data:
+            return
+        self.spreadsheet.values_batch_update({
+            "valueInputOption": "RAW",
+            "data": data,
+        })
+
+
+class SheetsWriteBuffer:
+    """
+    Write-behind буфер записей в таблицу.
+
+    Копит обновления строк и отправляет их одним values.batchUpdate
+    каждые flush_rows строк или flush_seconds секунд. Каждая строка
+    сначала дописывается в журнал на диске и удаляется из него только
+    после успешной отправки.
+
+    Журнал свой у каждой таблицы и процесса (GUI и parser_cli не мешают
+    друг другу), в строке журнала — id таблицы, ИНН и user_flow_id.
+    Строки прошлых запусков (свой журнал и журналы завершившихся
+    процессов) не отправляются, пока verify_replayed() не сверит их
+    строки с колонкой A: строки таблицы за это время могли сдвинуться.
+    """
+
+    def __init__(self, gs, flush_rows=WRITE_BATCH_ROWS, flush_seconds=WRITE_BATCH_SECONDS,
+                 journal_dir=WRITE_JOURNAL_DIR):
+        self.gs = gs
+        self.spreadsheet_id = gs.spreadsheet_id
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.journal_dir = Path(journal_dir)
+        self.journal = self.journal_dir / f"{self.spreadsheet_id}.{os.getpid()}.jsonl"
+        self._lock = threading.Lock()
+        # Строки к отправке и строки прошлых запусков, ждущие сверки
+        self._lines = []
+        self._replayed = []
+        self._last_flush = time.monotonic()
+        # После ошибки отправки (например, 429) не повторяем раньше этого момента
+        self._retry_at = 0
+        self._load_journals()
+
+    def _read_lines(self, path):
+        lines = []
+        for text in path.read_text(encoding="utf-8").splitlines():
+            try:
+                line = json.loads(text)
+            except ValueError:
+                # Строка, недописанная при падении
+                continue
+            if isinstance(line, dict) and line.get("spreadsheet_id") == self.spreadsheet_id:
+                lines.append(line)
+        return lines
+
+    def _orphaned(self, path, pid):
+        """Журнал другого процесса, который уже не допишет и не отправит его"""
+        try:
+            if time.time() - path.stat().st_mtime >= ORPHAN_JOURNAL_SECONDS:
+                return True
+        except OSError:
+            return False
+        return psutil is not None and not psutil.pid_exists(pid)
+
+    def _load_journals(self):
+        """Неотправленные строки прошлых запусков этой таблицы"""
+        try:
+            if not self.journal_dir.exists():
+                return
+            own_pid = os.getpid()
+            taken = []
+            for path in sorted(self.journal_dir.glob(f"{self.spreadsheet_id}.*.jsonl")):
+                try:
+                    pid = int(path.name.split(".")[1])
+                except (IndexError, ValueError):
+                    continue
+                if pid == own_pid:
+                    # Свой журнал (прошлый прогон в этом же окне)
+                    self._replayed.extend(self._read_lines(path))
+                    if path != self.journal:
+                        taken.append(path)
+                    continue
+                if not self._orphaned(path, pid):
+                    continue
+                # Забираем переименованием: из двух процессов журнал получит один
+                claimed = self.journal_dir / f"{self.spreadsheet_id}.{own_pid}.from{pid}.jsonl"
+                try:
+                    os.replace(path, claimed)
+                except OSError:
+                    continue
+                self._replayed.extend(self._read_lines(claimed))
+                taken.append(claimed)
+            if taken:
+                # Сначала всё в свой журнал, потом удаляем забранные файлы
+                self._rewrite_journal()
+                for path in taken:
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+        except Exception:
+            pass
+
+    def _rewrite_journal(self):
+        """Журнал заново из того, что ещё не отправлено (tmp + replace)"""
+        lines = self._replayed + self._lines
+        if not lines:
+            try:
+                self.journal.unlink()
+            except FileNotFoundError:
+                pass
+            return
+        self.journal_dir.mkdir(exist_ok=True)
+        tmp = self.journal.with_suffix(".tmp")
+        tmp.write_text(
+            "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines),
+            encoding="utf-8",
+        )
+        tmp.replace(self.journal)
+
+    @property
+    def pending_rows(self):
+        return len(self._lines)
+
+    @property
+    def replayed_rows(self):
+        """Строки прошлых запусков, ещё не сверенные с таблицей"""
+        return len(self._replayed)
+
+    def verify_replayed(self, mapping=None):
+        """
+        Сверка строк прошлых запусков с колонкой A: ячейка остаётся, если
+        в A её строки всё тот же ИНН (или ИНН с тем же user_flow_id по
+        mapping). Сверенные строки переходят в очередь на отправку,
+        остальные удаляются из журнала. Возвращает (оставлено, отброшено)
+        строк журнала. Если прочитать таблицу не удалось — исключение,
+        строки остаются в журнале до следующей попытки.
+        """
+        with self._lock:
+            if not self._replayed:
+                return 0, 0
+            rows_by_sheet = {}
+            for line in self._replayed:
+                for update in line["data"]:
+                    sheet, row = parse_a1_cell(update["range"])
+                    rows_by_sheet.setdefault(sheet, []).append(row)
+            actual = {}
+            for sheet, rows in rows_by_sheet.items():
+                for row, cells in self.gs.get_rows_cells(sheet, rows, [("A", "A")]).items():
+                    actual[(sheet, row)] = cell_text(cells.get("A"))
+
+            kept, dropped = [], 0
+            for line in self._replayed:
+                inn = normalize_inn(line.get("inn"))
+                ufid = line.get("user_flow_id")
+                data = []
+                for update in line["data"]:
+                    current = actual.get(parse_a1_cell(update["range"]), "")
+                    if current and (
+                        (inn and normalize_inn(current) == inn)
+                        or (mapping is not None and ufid and mapping.get(current) == ufid)
+                    ):
+                        data.append(update)
+                if data:
+                    kept.append(dict(line, data=data))
+                else:
+                    dropped += 1
+            self._replayed = []
+            self._lines = kept + self._lines
+            self._rewrite_journal()
+            return len(kept), dropped
+
+    def add_row(self, data, inn=None, user_flow_id=None):
+        """
+        Обновления одной строки таблицы ([{"range", "values"}, ...]) и ИНН,
+        который в ней должен стоять. Возвращает число отправленных строк,
+        если буфер сбросился.
+        """
+        line = {
+            "spreadsheet_id": self.spreadsheet_id,
+            "inn": inn,
+            "user_flow_id": user_flow_id,
+            "data": data,
+        }
+        with self._lock:
+            self.journal_dir.mkdir(exist_ok=True)
+            with open(self.journal, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._lines.append(line)
+        return self.flush_if_due()
+
+    def flush_if_due(self):
+        if time.monotonic() < self._retry_at:
+            return 0
+        due = len(self._lines) >= self.flush_rows or (
+            self._lines and time.monotonic() - self._last_flush >= self.flush_seconds
+        )
+        return self.flush() if due else 0
+
+    def flush(self):
+        """
+        Отправить всё накопленное (кроме несверенных строк прошлых
+        запусков). Возвращает число строк. При ошибке строки остаются
+        в буфере и журнале, а flush_if_due повторит отправку не раньше
+        чем через flush_seconds.
+        """
+        with self._lock:
+            if not self._lines:
+                return 0
+            try:
+                self.gs.batch_update_values(
+                    [update for line in self._lines for update in line["data"]]
+                )
+            except Exception:
+                self._retry_at = time.monotonic() + self.flush_seconds
+                try:
+                    # Процесс жив — журнал не считается брошенным
+                    os.utime(self.journal)
+                except OSError:
+                    pass
+                raise
+            rows = len(self._lines)
+            self._lines = []
+            self._last_flush = time.monotonic()
+            self._rewrite_journal()
+            return rows
@@ -0,0 +1,172 @@
+"""
+Общий на процесс индекс ИНН → user_flow_id (лист "Айди": A — ИНН, B — ID).
+
+Лист читается один раз (одним запросом A:B), ИНН нормализуются
+(только цифры) и хранятся компактно: отсортированный массив целых
+ключей и параллельный список ID, поиск — бинарный, O(log n).
+Когда индекс устаревает, он перечитывается в фоне, а до конца
+перечитывания обслуживают старые данные.
+
+    index = get_inn_index("service_account.json", spreadsheet_id)
+    index.get("7701234567")     # или index["..."], "..." in index
+"""
+
+import re
+import time
+import threading
+from array import array
+from bisect import bisect_left
+
+from sheets_service import get_service
+
+
+IDS_SHEET = "Айди"
+# Через сколько секунд индекс перечитывается в фоне
+INDEX_REFRESH_SECONDS = 600
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def normalize_inn(x):
+    """Нормализация ИНН - только цифры"""
+    return re.sub(r"\D", "", str(x or "").strip())
+
+
+def inn_key(inn):
+    """
+    Целый ключ ИНН. Длина хранится в младших разрядах, чтобы ИНН
+    с ведущими нулями ("0101...") не совпадали с более короткими.
+    """
+    inn = normalize_inn(inn)
+    if not inn or len(inn) > 15:
+        return None
+    return int(inn) * 100 + len(inn)
+
+
+class InnIndex:
+    """Неизменяемый индекс; поддерживает get, [], in и len как словарь"""
+
+    def __init__(self, pairs):
+        mapping = {}
+        for inn, flow_id in pairs:
+            key = inn_key(inn)
+            flow_id = (flow_id or "").strip()
+            if key is not None and flow_id:
+                # Как и раньше со словарём: при повторе ИНН побеждает нижняя строка
+                mapping[key] = flow_id
+        keys = sorted(mapping)
+        self._keys = array("Q", keys)
+        self._flow_ids = [mapping[k] for k in keys]
+
+    @classmethod
+    def from_rows(cls, rows, skip_header=True):
+        """Строки листа [[ИНН, ID, ...], ...]"""
+        rows = rows[1:] if skip_header else rows
+        return cls((row[0], row[1]) for row in rows if len(row) >= 2)
+
+    def get(self, inn, default=None):
+        key = inn_key(inn)
+        if key is None:
+            return default
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._flow_ids[i]
+        return default
+
+    def __getitem__(self, inn):
+        flow_id = self.get(inn)
+        if flow_id is None:
+            raise KeyError(inn)
+        return flow_id
+
+    def __contains__(self, inn):
+        return self.get(inn) is not None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class InnIndexService:
+    def __init__(self, creds_file, spreadsheet_id, sheet=IDS_SHEET,
+                 refresh_seconds=INDEX_REFRESH_SECONDS):
+        self.creds_file = creds_file
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet = sheet
+        self.refresh_seconds = refresh_seconds
+        self._index = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self):
+        spreadsheet = get_service(self.creds_file).spreadsheet(self.spreadsheet_id)
+        resp = spreadsheet.values_batch_get(
+            ["'{}'!A:B".format(self.sheet.replace("'", "''"))]
+        )
+        value_ranges = resp.get("valueRanges") or [{}]
+        return InnIndex.from_rows(value_ranges[0].get("values", []))
+
+    def load(self):
+        """Перечитать лист сейчас"""
+        index = self._fetch()
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+        return index
+
+    def _refresh_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            # Останемся на старых данных, попробуем при следующем обращении
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def age(self):
+        """Сколько секунд назад загружен индекс (None — ещё не загружен)"""
+        with self._lock:
+            if self._index is None:
+                return None
+            return time.monotonic() - self._loaded_at
+
+    def peek(self):
+        """
+        Текущий индекс без обращения к сети (None — ещё не загружен).
+        Устаревший индекс отдаётся как есть и перечитывается в фоне.
+        """
+        with self._lock:
+            index = self._index
+            stale = time.monotonic() - self._loaded_at > self.refresh_seconds
+            start_refresh = index is not None and stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return index
+
+    def index(self):
+        """Текущий индекс; первый раз — загрузка, дальше — фоновое обновление"""
+        index = self.peek()
+        return index if index is not None else self.load()
+
+    def get(self, inn, default=None):
+        return self.index().get(inn, default)
+
+
+def get_inn_index(creds_file, spreadsheet_id, sheet=IDS_SHEET):
+    """InnIndexService для таблицы и листа (один на процесс)"""
+    key = (creds_file, spreadsheet_id, sheet)
+    with _indexes_lock:
+        service = _indexes.get(key)
+        if service is None:
+            service = InnIndexService(creds_file, spreadsheet_id, sheet)
+            _indexes[key] = service
+        return service
+
+
+def reset_indexes():
+    with _indexes_lock:
+        _indexes.clear()
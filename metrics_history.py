@@ -0,0 +1,126 @@
+"""
+Локальная история результатов парсера (SQLite, metrics_history.db).
+
+Каждый успешный process_record сохраняется с временем обработки
+под ключом (ИНН, user_flow_id, набор фильтров). По истории парсер
+пропускает недавно обновлённые строки, а прошлые значения можно
+посмотреть без браузера:
+
+    history = MetricsHistory()
+    history.latest("7701234567")
+    history.history("7701234567", limit=10)
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+
+HISTORY_DB_FILE = "metrics_history.db"
+
+METRIC_FIELDS = ["total", "rich", "filtered", "himera_finance", "old_without_delay"]
+
+
+def filters_key(filters):
+    """Набор фильтров в виде строки, одинаковой для одинаковых фильтров"""
+    return json.dumps(filters or {}, ensure_ascii=False, sort_keys=True)
+
+
+class MetricsHistory:
+    def __init__(self, path=HISTORY_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # Пишет поток обработки, читает вкладка — соединение общее под блокировкой
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    inn TEXT NOT NULL,
+                    user_flow_id TEXT NOT NULL,
+                    filters TEXT NOT NULL,
+                    scraped_at REAL NOT NULL,
+                    total INTEGER,
+                    rich INTEGER,
+                    filtered INTEGER,
+                    himera_finance INTEGER,
+                    old_without_delay INTEGER,
+                    supports TEXT
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS metrics_key "
+                "ON metrics (inn, user_flow_id, filters, scraped_at)"
+            )
+
+    def record(self, inn, user_flow_id, filters, data, scraped_at=None):
+        """Сохранить результат process_record"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO metrics (inn, user_flow_id, filters, scraped_at, "
+                "total, rich, filtered, himera_finance, old_without_delay, supports) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    inn,
+                    user_flow_id,
+                    filters_key(filters),
+                    scraped_at or time.time(),
+                    *[data.get(field) for field in METRIC_FIELDS],
+                    json.dumps(data.get("supports") or [], ensure_ascii=False),
+                ),
+            )
+
+    def last_scraped(self, inn, user_flow_id, filters):
+        """Время последней обработки (unix time) или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MAX(scraped_at) FROM metrics "
+                "WHERE inn = ? AND user_flow_id = ? AND filters = ?",
+                (inn, user_flow_id, filters_key(filters)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, inn, user_flow_id, filters, hours):
+        """Обновлялась ли запись с теми же фильтрами за последние hours часов"""
+        scraped_at = self.last_scraped(inn, user_flow_id, filters)
+        return scraped_at is not None and time.time() - scraped_at < hours * 3600
+
+    def history(self, inn, user_flow_id=None, filters=None, limit=None):
+        """Прошлые значения по ИНН, новые первыми"""
+        sql = "SELECT * FROM metrics WHERE inn = ?"
+        args = [inn]
+        if user_flow_id is not None:
+            sql += " AND user_flow_id = ?"
+            args.append(user_flow_id)
+        if filters is not None:
+            sql += " AND filters = ?"
+            args.append(filters_key(filters))
+        sql += " ORDER BY scraped_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def latest(self, inn, user_flow_id=None, filters=None):
+        """Последние значения по ИНН или None"""
+        rows = self.history(inn, user_flow_id, filters, limit=1)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def _to_dict(row):
+        result = dict(row)
+        result["filters"] = json.loads(result["filters"])
+        result["supports"] = json.loads(result["supports"] or "[]")
+        return result
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
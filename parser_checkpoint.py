@@ -0,0 +1,119 @@
+"""
+Чекпоинт задания парсера. Если приложение упало, Chrome закрылся
+или окно закрыли посреди прогона, при следующем запуске вкладка Parser
+предлагает продолжить и пропускает уже обработанные строки.
+
+Файл parser_checkpoint.json:
+    {
+        "job_id": "20261017-101500",
+        "sheet": "1кк",
+        "presets": [["500к", {фильтры}], ...],
+        "tasks": [[[["1кк", 5], ["500к", 7]], "ИНН", "user_flow_id", {фильтры}], ...],
+        "done": [["1кк", 5], ...]
+    }
+"""
+
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+
+CHECKPOINT_FILE = "parser_checkpoint.json"
+
+
+class JobCheckpoint:
+    """Задание парсера и строки, которые уже обработаны"""
+
+    def __init__(self, job, path=CHECKPOINT_FILE):
+        self.path = Path(path)
+        self.job_id = job.get("job_id", "")
+        self.sheet = job.get("sheet", "")
+        self.presets = [(sheet, flt) for sheet, flt in job.get("presets", [])]
+        self.tasks = [
+            ([(sheet, int(row)) for sheet, row in targets], inn, ufid, filters)
+            for targets, inn, ufid, filters in job.get("tasks", [])
+        ]
+        self.done = {(sheet, int(row)) for sheet, row in job.get("done", [])}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def new(cls, sheet, tasks, presets=None, path=CHECKPOINT_FILE):
+        checkpoint = cls({
+            "job_id": datetime.now().strftime("%Y%m%d-%H%M%S"),
+            "sheet": sheet,
+            "presets": presets or [],
+            "tasks": tasks,
+        }, path)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_FILE):
+        """Незавершённое задание или None"""
+        try:
+            p = Path(path)
+            if p.exists():
+                checkpoint = cls(json.loads(p.read_text(encoding="utf-8")), path)
+                if checkpoint.pending_tasks():
+                    return checkpoint
+        except Exception:
+            pass
+        return None
+
+    @property
+    def total_rows(self):
+        return sum(len(targets) for targets, _, _, _ in self.tasks)
+
+    @property
+    def done_rows(self):
+        return len(self.done)
+
+    def pending_tasks(self):
+        """Задачи без уже обработанных строк"""
+        result = []
+        for targets, inn, ufid, filters in self.tasks:
+            left = [t for t in targets if t not in self.done]
+            if left:
+                result.append((left, inn, ufid, filters))
+        return result
+
+    def drop_targets(self, targets):
+        """Убрать строки из задания (например, строка в таблице сдвинулась)"""
+        drop = {(sheet, int(row)) for sheet, row in targets}
+        with self._lock:
+            self.tasks = [
+                ([t for t in task_targets if t not in drop], inn, ufid, filters)
+                for task_targets, inn, ufid, filters in self.tasks
+            ]
+            self.tasks = [task for task in self.tasks if task[0]]
+            self.save()
+
+    def mark_done(self, targets):
+        with self._lock:
+            self.done.update((sheet, int(row)) for sheet, row in targets)
+            self.save()
+
+    def save(self):
+        job = {
+            "job_id": self.job_id,
+            "sheet": self.sheet,
+            "presets": [[sheet, flt] for sheet, flt in self.presets],
+            "tasks": [
+                [[list(t) for t in targets], inn, ufid, filters]
+                for targets, inn, ufid, filters in self.tasks
+            ],
+            "done": sorted([sheet, row] for sheet, row in self.done),
+        }
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception:
+            pass
+
+    def clear(self):
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Запуск парсера без GUI — для сервера и cron. PyQt5 не импортируется.
+
+Примеры:
+    python parser_cli.py --sheet 1кк --rows all
+    python parser_cli.py --sheet 500к --rows 2-120 --min-deposit 500000 --workers 4
+    python parser_cli.py --sheet 0 --rows empty --quiet
+
+Настройки (логин, пароль, таблица, service account) берутся из config.json.
+Каждая строка stdout — JSON-событие:
+    {"event": "start", ...}, {"event": "log", "message": ...},
+    {"event": "progress", "done": 3, "total": 40},
+    {"event": "result", "inn": ..., "rows": [["1кк", 5]], "status": "OK", ...},
+    {"event": "finish", "done": 40, "failed": 1, "stopped": false, "error": null}
+
+Коды выхода:
+    0 — все записи обработаны
+    1 — прогон прерван ошибкой (таблица, браузер и т.п.)
+    2 — неверные аргументы, конфиг или вход на сайт
+    3 — прогон завершён, но часть записей с ошибкой
+    130 — остановлено по Ctrl+C (уже набранное записано в таблицу)
+"""
+
+import sys
+import json
+import argparse
+import threading
+from pathlib import Path
+
+from google_api import GoogleSheetsAPI
+from resource_blocking import block_profile
+from metrics_history import MetricsHistory
+from parser_pipeline import (
+    ParserJob,
+    ALLOWED_SHEETS,
+    SHEET_FILTER_PRESETS,
+    sheet_filters,
+    group_flow_tasks,
+    read_current_values,
+    order_by_staleness,
+    same_cell_value,
+)
+
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_FAILED_RECORDS = 3
+EXIT_INTERRUPTED = 130
+
+DEFAULT_SPREADSHEET_ID = "1U5LgHZMljA7DdjtxXCTaUB-GmK4uyxXCo5Io4pSScQk"
+
+
+def emit(event, **fields):
+    """Одно JSON-событие в stdout"""
+    fields = {"event": event, **fields}
+    sys.stdout.write(json.dumps(fields, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
+
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_rows(spec):
+    """'5-40,52,60-61' → {5, ..., 40, 52, 60, 61}"""
+    rows = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            rows.update(range(int(start), int(end) + 1))
+        else:
+            rows.add(int(part))
+    return rows
+
+
+def build_parser():
+    p = argparse.ArgumentParser(description="Парсер ITNELEP → Google Sheets без GUI")
+    p.add_argument("--sheet", required=True, help="лист таблицы: " + ", ".join(ALLOWED_SHEETS))
+    p.add_argument(
+        "--rows", default="all",
+        help="all — все строки, empty — строки с пустыми E:H, "
+             "или номера строк листа: 5-40,52",
+    )
+    p.add_argument("--config", default="config.json", help="путь к config.json")
+
+    flt = p.add_argument_group("фильтры")
+    flt.add_argument("--no-ready-2months", action="store_true", help="без «2 месяца + ошибки»")
+    flt.add_argument("--old", action="store_true", help="старые (55+)")
+    flt.add_argument("--without-notes", action="store_true", help="без заметок")
+    flt.add_argument("--min-deposit", type=int, default=None, help="минимальный депозит")
+    flt.add_argument(
+        "--preset", action="store_true",
+        help="фильтры листа из пресета (config.json → sheet_presets) вместо флагов",
+    )
+
+    run = p.add_argument_group("запуск")
+    run.add_argument("--workers", type=int, default=3, help="браузеров параллельно")
+    run.add_argument("--show-browser", action="store_true", help="не скрывать Chrome")
+    run.add_argument("--skip-fresh", type=int, default=0, metavar="HOURS",
+                     help="пропускать строки, обновлённые за последние HOURS часов")
+    run.add_argument("--stale-first", action="store_true",
+                     help="сначала строки с пустыми E:H и самыми старыми подкрепами")
+    run.add_argument("--quiet", action="store_true", help="не выводить события log")
+    return p
+
+
+def select_rows(gs, sheet, spec, inn_rows):
+    """Номера строк листа по --rows"""
+    all_rows = sorted(row for rows in inn_rows.values() for row in rows)
+    if spec == "all":
+        return all_rows
+    if spec == "empty":
+        values = gs.get_rows_values(sheet, all_rows)
+        return [
+            row for row in all_rows
+            if any(same_cell_value(v, "") for v in values.get(row, [""])[:4])
+        ]
+    wanted = parse_rows(spec)
+    return [row for row in all_rows if row in wanted]
+
+
+def make_pool(args, config, log):
+    """ScraperPool с выполненным входом на сайт"""
+    from scraper import ScraperPool, RECYCLE_EVERY, MEMORY_LIMIT_MB
+    log(f"🌐 Запуск браузеров: {args.workers}...")
+    pool = ScraperPool(
+        args.workers,
+        headless=not args.show_browser,
+        block=block_profile(config),
+        recycle_every=int(config.get("recycle_every", RECYCLE_EVERY)),
+        memory_limit_mb=int(config.get("memory_limit_mb", MEMORY_LIMIT_MB)),
+    )
+    try:
+        log("🔐 Вход на сайт...")
+        pool.login(config.get("login", "").strip(), config.get("password", "").strip())
+        return pool
+    except Exception:
+        pool.quit()
+        raise
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    log = (lambda msg: None) if args.quiet else (lambda msg: emit("log", message=msg))
+    if args.sheet not in ALLOWED_SHEETS:
+        emit("finish", error=f"--sheet: лист «{args.sheet}» не поддерживается ({', '.join(ALLOWED_SHEETS)})")
+        return EXIT_USAGE
+    if args.rows not in ("all", "empty"):
+        try:
+            parse_rows(args.rows)
+        except ValueError:
+            emit("finish", error=f"--rows: не понимаю «{args.rows}»")
+            return EXIT_USAGE
+
+    try:
+        config = load_config(args.config) if Path(args.config).exists() else {}
+    except Exception as e:
+        emit("finish", error=f"config.json: {e}")
+        return EXIT_USAGE
+    if not config.get("login", "").strip() or not config.get("password", "").strip():
+        emit("finish", error="в config.json не указаны login и password")
+        return EXIT_USAGE
+
+    try:
+        gs = GoogleSheetsAPI(
+            config.get("service_account_file", "service_account.json"),
+            config.get("spreadsheet_id", DEFAULT_SPREADSHEET_ID),
+        )
+        inn_rows = gs.get_inn_rows([args.sheet]).get(args.sheet, {})
+        rows = select_rows(gs, args.sheet, args.rows, inn_rows)
+        mapping = gs.get_inn_id_mapping(fresh=True)
+    except Exception as e:
+        emit("finish", error=f"Google Sheets: {e}")
+        return EXIT_ERROR
+
+    filters = {
+        "ready_2months": not args.no_ready_2months,
+        "old": args.old,
+        "without_notes": args.without_notes,
+        "min_deposit": args.min_deposit,
+    }
+    if args.preset:
+        filters = sheet_filters(filters, args.sheet, config.get("sheet_presets") or SHEET_FILTER_PRESETS)
+
+    sheet_inns = {args.sheet: {row: inn for inn, inn_list in inn_rows.items() for row in inn_list}}
+    tasks, missing = group_flow_tasks({args.sheet: rows}, sheet_inns, mapping, lambda sheet: filters)
+    for inn in missing:
+        log(f"[ИНН {inn}] Не найден user_flow_id")
+
+    try:
+        history = MetricsHistory()
+    except Exception as e:
+        emit("finish", error=f"история результатов: {e}")
+        return EXIT_ERROR
+    try:
+        if args.skip_fresh:
+            before = len(tasks)
+            tasks = [t for t in tasks if not history.is_fresh(t[1], t[2], t[3], args.skip_fresh)]
+            log(f"⏭ Пропущено заходов, обновлённых за {args.skip_fresh} ч: {before - len(tasks)}")
+
+        current_values = None
+        if args.stale_first and tasks:
+            current_values = read_current_values(gs, tasks)
+            tasks = order_by_staleness(tasks, current_values)
+    except Exception as e:
+        history.close()
+        emit("finish", error=f"подготовка задач: {e}")
+        return EXIT_ERROR
+
+    emit(
+        "start", sheet=args.sheet, rows=sum(len(t[0]) for t in tasks),
+        tasks=len(tasks), filters=filters, workers=args.workers,
+    )
+    if not tasks:
+        history.close()
+        emit("finish", total=0, done=0, failed=0, stopped=False, error=None)
+        return EXIT_OK
+
+    try:
+        pool = make_pool(args, config, log)
+    except Exception as e:
+        emit("finish", error=f"вход на сайт: {e}")
+        history.close()
+        return EXIT_USAGE
+
+    def on_result(task, data):
+        targets, inn, ufid, _ = task
+        emit(
+            "result", inn=inn, user_flow_id=ufid, rows=targets,
+            status=data.get("status"),
+            **{k: data.get(k) for k in (
+                "total", "rich", "filtered", "himera_finance", "old_without_delay", "load_ms"
+            )},
+        )
+
+    job = ParserJob(
+        pool, gs, tasks,
+        history=history, current_values=current_values,
+        log=log,
+        progress=lambda done, total: emit("progress", done=done, total=total),
+        on_result=on_result,
+    )
+
+    # Прогон в отдельном потоке: Ctrl+C останавливает запуск новых записей,
+    # а начатые дописываются и отправляются в таблицу
+    summary = {}
+    runner = threading.Thread(target=lambda: summary.update(job.run()), daemon=True)
+    runner.start()
+    interrupted = False
+    while runner.is_alive():
+        try:
+            runner.join(0.5)
+        except KeyboardInterrupt:
+            interrupted = True
+            job.stop()
+
+    try:
+        pool.quit()
+    finally:
+        history.close()
+
+    emit("finish", **summary)
+    if summary.get("error"):
+        return EXIT_ERROR
+    if interrupted:
+        return EXIT_INTERRUPTED
+    if summary.get("failed"):
+        return EXIT_FAILED_RECORDS
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
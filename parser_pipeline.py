@@ -0,0 +1,476 @@
+"""
+Конвейер парсера без Qt: парсинг записей пулом браузеров (ScraperPool)
+и запись результатов в Google Sheets.
+
+Используется вкладкой Parser (через ParserWorker) и консольным
+запуском parser_cli.py — поэтому здесь нельзя импортировать PyQt5.
+
+Задача — один заход на страницу потока:
+    (цели [(лист, строка)], ИНН, user_flow_id, фильтры)
+"""
+
+import re
+import queue
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+
+from google_api import GoogleSheetsAPI, SheetsWriteBuffer, LEGACY_JOURNAL_FILE, a1_range, cell_text
+from inn_index import normalize_inn
+from resource_blocking import format_page_stats, LoadStats
+
+
+# Сколько готовых записей может ждать записи в таблицу, пока браузеры
+# продолжают парсить. Если запись отстаёт — парсинг притормаживает.
+RESULT_QUEUE_SIZE = 10
+
+ALLOWED_SHEETS = ["1кк", "500к", "0", "2кк дальняк", "У чатеров"]
+
+# Фильтры, которыми считается колонка G на каждом листе.
+# Переопределяется в config.json ключом "sheet_presets".
+SHEET_FILTER_PRESETS = {
+    "1кк": {"min_deposit": 1000000},
+    "500к": {"min_deposit": 500000},
+    "0": {},
+    "2кк дальняк": {"min_deposit": 2000000},
+}
+
+
+def sheet_filters(base, sheet, presets=None):
+    """Фильтры листа из пресета поверх base; без пресета — base как есть"""
+    presets = presets or SHEET_FILTER_PRESETS
+    if sheet not in presets:
+        return dict(base)
+    flt = {
+        "ready_2months": base["ready_2months"],
+        "old": False,
+        "without_notes": base["without_notes"],
+        "min_deposit": None,
+    }
+    flt.update(presets[sheet])
+    return flt
+
+
+def group_flow_tasks(selection, sheet_inns, mapping, filters_for):
+    """
+    Задачи из выбранных строк. Строки всех листов группируются по
+    user_flow_id и набору фильтров: поток открывается один раз на набор,
+    результат пишется во все строки, которые на него ссылаются.
+
+    selection — {лист: [строки]}, sheet_inns — {лист: {строка: ИНН}},
+    mapping — {ИНН: user_flow_id}, filters_for(лист) — фильтры листа.
+    Возвращает (задачи, ИНН без user_flow_id).
+    """
+    groups = {}
+    missing = []
+    for sheet, rows in selection.items():
+        filters = filters_for(sheet)
+        key = tuple(sorted(filters.items()))
+        inns = sheet_inns.get(sheet, {})
+        for gs_row in sorted(rows):
+            inn = inns.get(gs_row)
+            if not inn:
+                continue
+            ufid = mapping.get(inn)
+            if not ufid:
+                if inn not in missing:
+                    missing.append(inn)
+                continue
+            task = groups.setdefault((ufid, key), ([], inn, ufid, filters))
+            task[0].append((sheet, gs_row))
+    return list(groups.values()), missing
+
+
+def same_cell_value(current, value):
+    """Совпадает ли значение из таблицы с тем, что собираемся записать"""
+    if current is None:
+        current = ""
+    if value is None:
+        value = ""
+    if isinstance(current, float) and current.is_integer():
+        current = int(current)
+    return str(current).strip() == str(value).strip()
+
+
+def verify_targets(gs, tasks, mapping=None):
+    """
+    Сверка целевых строк с колонкой A таблицы прямо перед записью: строки
+    могли вставить, удалить или отсортировать после того, как номера строк
+    были прочитаны (снимок, чекпоинт). Строка остаётся, если в A всё тот же
+    ИНН задачи (или ИНН с тем же user_flow_id по mapping).
+    Возвращает (задачи, отброшенные [((лист, строка), ИНН задачи, ИНН в A)]).
+    """
+    rows_by_sheet = {}
+    for targets, _, _, _ in tasks:
+        for sheet, gs_row in targets:
+            rows_by_sheet.setdefault(sheet, []).append(gs_row)
+    actual = {}
+    for sheet, rows in rows_by_sheet.items():
+        for gs_row, cells in gs.get_rows_cells(sheet, rows, [("A", "A")]).items():
+            actual[(sheet, gs_row)] = cell_text(cells.get("A"))
+
+    kept, dropped = [], []
+    for targets, inn, ufid, filters in tasks:
+        left = []
+        for target in targets:
+            current = actual.get(target, "")
+            if current and (
+                normalize_inn(current) == normalize_inn(inn)
+                or (mapping is not None and mapping.get(current) == ufid)
+            ):
+                left.append(target)
+            else:
+                dropped.append((target, inn, current))
+        if left:
+            kept.append((left, inn, ufid, filters))
+    return kept, dropped
+
+
+def read_current_values(gs, tasks):
+    """E:H и K всех целевых строк задач, по запросу на лист: {(лист, строка): [E..K]}"""
+    rows_by_sheet = {}
+    for targets, _, _, _ in tasks:
+        for sheet, gs_row in targets:
+            rows_by_sheet.setdefault(sheet, []).append(gs_row)
+    result = {}
+    for sheet, rows in rows_by_sheet.items():
+        for gs_row, values in gs.get_rows_values(sheet, rows).items():
+            result[(sheet, gs_row)] = values
+    return result
+
+
+def latest_support_dt(text):
+    """Самая свежая дата подкрепа в колонке K ('Имя — 12.09.2025 14:30') или None"""
+    dates = []
+    for m in re.finditer(r"(\d{2}\.\d{2}\.\d{4})(?:\s+(\d{2}:\d{2}))?", str(text or "")):
+        try:
+            dates.append(datetime.strptime(
+                m.group(1) + " " + (m.group(2) or "00:00"), "%d.%m.%Y %H:%M"
+            ))
+        except ValueError:
+            continue
+    return max(dates) if dates else None
+
+
+def staleness(values):
+    """
+    Насколько строка нуждается в обновлении (меньше — раньше в очереди):
+    сначала строки с пустыми ячейками E:H, затем по давности последнего подкрепа
+    """
+    if values is None:
+        return (0, datetime.min)
+    empty = any(same_cell_value(value, "") for value in values[:4])
+    return (0 if empty else 1, latest_support_dt(values[6]) or datetime.min)
+
+
+def order_by_staleness(tasks, current_values):
+    """Задачи по убыванию устаревания; для задачи берётся самая устаревшая строка"""
+    def key(task):
+        return min(staleness(current_values.get(target)) for target in task[0])
+    return sorted(tasks, key=key)
+
+
+def describe_staleness(task, current_values):
+    empty, dt = min(staleness(current_values.get(target)) for target in task[0])
+    if empty == 0:
+        return "пустые метрики"
+    if dt == datetime.min:
+        return "нет даты подкрепа"
+    return f"подкреп {dt:%d.%m.%Y %H:%M}"
+
+
+class ParserJob:
+    """
+    Один прогон парсера. Сообщения и прогресс отдаются через колбэки
+    log(str) и progress(done, total); on_result(task, data) вызывается
+    для каждой обработанной записи. run() ничего не бросает — итог
+    (в т.ч. ошибка) возвращается словарём.
+    """
+
+    def __init__(self, pool, gs, tasks, presets=None, preset_rows=None, checkpoint=None,
+                 history=None, current_values=None, log=None, progress=None, on_result=None):
+        self.pool = pool
+        self.gs = gs
+        self.tasks = tasks
+        # Другие листы, для которых за тот же заход считается колонка G:
+        # presets — [(лист, фильтры)], preset_rows — {лист: {ИНН: [строки]}}
+        self.presets = presets or []
+        self.preset_rows = preset_rows or {}
+        # Отметки обработанных строк — для продолжения после сбоя
+        self.checkpoint = checkpoint
+        # Локальная история результатов (MetricsHistory)
+        self.history = history
+        # Значения E:K целевых строк на момент старта: {(лист, строка): [E..K]};
+        # None — прочитать в начале прогона
+        self.current_values = current_values
+        self.log = log or (lambda msg: None)
+        self.progress = progress or (lambda done, total: None)
+        self.on_result = on_result
+        self.skipped_cells = 0
+        self.failed = 0
+        self._is_running = True
+
+    @property
+    def is_running(self):
+        return self._is_running
+
+    def stop(self):
+        self._is_running = False
+
+    def scrape(self, inn, ufid, filters):
+        """Обработка одной записи в свободном браузере пула"""
+        if not self._is_running:
+            return None
+        self.log(f"[ИНН {inn}] user_flow_id={ufid}")
+        if self.presets:
+            return self.pool.process_record_presets(
+                inn, ufid, [filters] + [flt for _, flt in self.presets]
+            )
+        return self.pool.process_record(inn, ufid, filters)
+
+    def produce(self, results, task):
+        """Парсинг одной записи; результат (или ошибка) уходит в очередь"""
+        targets, inn, ufid, filters = task
+        try:
+            results.put((task, self.scrape(inn, ufid, filters), None))
+        except Exception as e:
+            results.put((task, None, e))
+
+    def preset_updates(self, inn, data):
+        """Колонка G на других листах из того же захода на страницу"""
+        counts = data.get("filtered_presets") or []
+        updates = []
+        for (sheet, _), count in zip(self.presets, counts[1:]):
+            if count is None:
+                # Пресет не успел переключиться — ячейку не трогаем
+                continue
+            for row in self.preset_rows.get(sheet, {}).get(inn, []):
+                updates.append({"range": a1_range(sheet, f"G{row}"), "values": [[count]]})
+        return updates
+
+    def row_updates(self, sheet, gs_row, data):
+        """
+        Обновления E:H и K строки листа — только ячейки, значение которых
+        отличается от прочитанного из таблицы в начале прогона. Запись
+        с ошибкой не пишется вовсе: пустые метрики затёрли бы прежние.
+        """
+        if data.get("status") != "OK":
+            self.skipped_cells += 5
+            return []
+        supports_text = "\n".join(data["supports"]) if data["supports"] else "Нет подкрепов"
+        values = GoogleSheetsAPI.row_metrics_values(
+            data['total'],
+            data['rich'],
+            data['filtered'],
+            data['himera_finance'],
+            data['old_without_delay']
+        )
+        cells = list(zip("EFGH", values)) + [("K", supports_text)]
+        current = self.current_values.get((sheet, gs_row))
+        updates = []
+        for col, value in cells:
+            if current is not None and same_cell_value(current[ord(col) - ord("E")], value):
+                self.skipped_cells += 1
+                continue
+            updates.append({"range": a1_range(sheet, f"{col}{gs_row}"), "values": [[value]]})
+        return updates
+
+    def flush(self, buffer, force=False):
+        sent = buffer.flush() if force else buffer.flush_if_due()
+        if sent:
+            self.log(f"💾 Отправлено в таблицу: {sent} строк")
+
+    def try_flush(self, buffer, force=False):
+        """
+        Сброс буфера посреди прогона: ошибка записи (квота 429, сеть) не
+        останавливает браузеры — строки уже в журнале, отправка повторится
+        при следующем сбросе или в конце прогона
+        """
+        try:
+            self.flush(buffer, force)
+        except Exception as e:
+            self.log(
+                f"⚠️ Не удалось отправить в таблицу ({buffer.pending_rows} строк): {e} — повторю позже"
+            )
+
+    def replay_journal(self, buffer):
+        """
+        Досылка строк, не отправленных прошлыми запусками. Они уже отмечены
+        в чекпоинте как готовые, поэтому перед отправкой сверяются
+        с колонкой A, как verify_targets для задач
+        """
+        if Path(LEGACY_JOURNAL_FILE).exists():
+            self.log(
+                f"⚠️ {LEGACY_JOURNAL_FILE} старого формата (без id таблицы) не досылается — "
+                "проверьте и удалите вручную"
+            )
+        if not buffer.replayed_rows:
+            return
+        self.log(f"↻ Неотправленные строки прошлых запусков: {buffer.replayed_rows}, сверяю с таблицей...")
+        try:
+            mapping = self.gs.get_inn_id_mapping()
+        except Exception:
+            mapping = None
+        try:
+            kept, dropped = buffer.verify_replayed(mapping)
+        except Exception as e:
+            self.log(f"⚠️ Не удалось сверить с таблицей: {e} — строки остаются в журнале до следующего запуска")
+            return
+        if dropped:
+            self.log(f"⚠️ ИНН в строках сменился, не досылается: {dropped} строк")
+        if kept:
+            self.log(f"↻ Досылаю неотправленные строки прошлых запусков: {kept}")
+            self.try_flush(buffer, force=True)
+
+    def handle_result(self, buffer, targets, inn, ufid, data):
+        self.log("-" * 40)
+        self.log(
+            f"[ИНН {inn}] total={data['total']} rich={data['rich']} "
+            f"filtered={data['filtered']} himera={data['himera_finance']} "
+            f"old_no_delay={data['old_without_delay']}"
+        )
+        page_stats = format_page_stats(data)
+        if page_stats:
+            self.log(f"[ИНН {inn}] загрузка: {page_stats}")
+
+        # В таблицу уходит пачкой из буфера, строка сразу попадает в журнал
+        updates = []
+        for sheet, gs_row in targets:
+            updates.extend(self.row_updates(sheet, gs_row, data))
+        presets = self.preset_updates(inn, data)
+        updates.extend(presets)
+        if presets:
+            sheets = sorted({u["range"].rsplit("!", 1)[0].strip("'") for u in presets})
+            self.log(f"[ИНН {inn}] G на листах: {', '.join(sheets)}")
+        where = ", ".join(f"{sheet}:{gs_row}" for sheet, gs_row in targets)
+        if not updates:
+            if data.get("status") != "OK":
+                self.log(f"[ИНН {inn}] {data.get('status')} — ячейки не перезаписываются ({where})")
+            else:
+                self.log(f"[ИНН {inn}] без изменений, не перезаписывается ({where})")
+            return
+        buffer.add_row(updates, inn, ufid)
+        self.log(f"[ИНН {inn}] в очереди на запись ({where})")
+
+    def save_history(self, inn, ufid, filters, data):
+        if not self.history:
+            return
+        try:
+            self.history.record(inn, ufid, filters, data)
+        except Exception as e:
+            self.log(f"⚠️ История не сохранена: {e}")
+
+    def load_current_values(self):
+        """Чтение E:K по всем целевым строкам перед парсингом, по запросу на лист"""
+        try:
+            self.current_values = read_current_values(self.gs, self.tasks)
+        except Exception as e:
+            # Без текущих значений просто пишем всё, как раньше
+            self.current_values = {}
+            self.log(f"⚠️ Не удалось прочитать текущие значения, пишу все ячейки: {e}")
+
+    def browser_pool(self):
+        """ScraperPool этого прогона (None — пул без учёта памяти)"""
+        return self.pool if hasattr(self.pool, "memory_stats") else None
+
+    def run(self):
+        """
+        Прогон всех задач. Итог: {"total", "done", "failed", "stopped", "error"}
+        (error — текст ошибки, прервавшей прогон, или None).
+        """
+        summary = {"total": len(self.tasks), "done": 0, "failed": 0, "stopped": False, "error": None}
+        buffer = None
+        try:
+            browsers = self.browser_pool()
+            if browsers:
+                browsers.reset_memory_stats()
+            buffer = SheetsWriteBuffer(self.gs)
+            self.replay_journal(buffer)
+
+            if self.current_values is None:
+                self.load_current_values()
+
+            total = len(self.tasks)
+            done = 0
+            load_stats = LoadStats()
+            error = None
+            results = queue.Queue(maxsize=RESULT_QUEUE_SIZE)
+            # Производитель — браузеры пула, потребитель — этот поток
+            # (запись в таблицу и лог), между ними ограниченная очередь
+            with ThreadPoolExecutor(max_workers=len(self.pool)) as ex:
+                futures = [ex.submit(self.produce, results, task) for task in self.tasks]
+                while True:
+                    try:
+                        task, data, exc = results.get(timeout=1)
+                    except queue.Empty:
+                        if results.empty() and all(f.done() for f in futures):
+                            break
+                        task, data, exc = None, None, None
+                    if exc is None and error is None:
+                        try:
+                            if data is not None:
+                                targets, inn, ufid, filters = task
+                                self.handle_result(buffer, targets, inn, ufid, data)
+                                if data.get("status") == "OK":
+                                    self.save_history(inn, ufid, filters, data)
+                                    if self.checkpoint:
+                                        # Строка уже в журнале буфера — повторять не нужно
+                                        self.checkpoint.mark_done(targets)
+                                else:
+                                    self.failed += 1
+                                if self.on_result:
+                                    self.on_result(task, data)
+                                load_stats.add(data)
+                                done += 1
+                                self.progress(done, total)
+                            # Сброс буфера по числу строк или по времени
+                            self.try_flush(buffer)
+                        except Exception as e:
+                            exc = e
+                    if exc is not None and error is None:
+                        # Не запускаем оставшиеся записи, но дочитываем очередь,
+                        # чтобы не держать браузеры на put()
+                        error = exc
+                        self.stop()
+            summary["done"] = done
+            summary["failed"] = self.failed
+            if error is not None:
+                raise error
+
+            if not self._is_running:
+                summary["stopped"] = True
+                self.log("⏹ Остановлено пользователем")
+            self.log(f"📦 {load_stats.summary()}")
+            if browsers:
+                stats = browsers.memory_stats()
+                self.log(
+                    f"🧹 Перезапусков браузера: {stats['recycles']}, "
+                    f"пик памяти Chrome: {stats['peak_memory_mb'] or '—'} МБ"
+                )
+            if self.skipped_cells:
+                self.log(f"⏭ Не перезаписано ячеек без изменений: {self.skipped_cells}")
+            self.flush(buffer, force=True)
+            if self.checkpoint:
+                left = len(self.checkpoint.pending_tasks())
+                if left:
+                    # Остановка или ошибки записей — их можно продолжить позже
+                    self.log(f"📌 Не обработано записей: {left}, задание можно продолжить")
+                else:
+                    self.checkpoint.clear()
+            self.log("Готово ✔")
+        except Exception as e:
+            summary["error"] = str(e)
+            self.log(f"ОШИБКА: {str(e)}")
+        finally:
+            try:
+                # Остановка или ошибка: отправляем то, что уже набралось
+                if buffer is not None:
+                    self.flush(buffer, force=True)
+            except Exception as e:
+                summary["error"] = summary["error"] or str(e)
+                self.log(
+                    f"ОШИБКА записи в таблицу: {str(e)} — строки сохранены в журнале "
+                    "и будут дозаписаны при следующем запуске"
+                )
+        return summary
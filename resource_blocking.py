@@ -0,0 +1,140 @@
+"""
+Общий профиль блокировки ресурсов для всех автоматизированных браузеров:
+Selenium (scraper.py) и Playwright (вкладки Переименование, Обрезка,
+Генератор приветствий). Мы читаем со страниц только текст, поэтому
+картинки, шрифты, медиа и сторонние скрипты не загружаем.
+
+Настраивается в config.json:
+    "block_resources": {
+        "enabled": true,
+        "types": ["image", "font", "media"],
+        "patterns": ["*google-analytics.com*", ...],
+        "eager": true
+    }
+"""
+
+import fnmatch
+
+
+BLOCKED_RESOURCE_TYPES = ["image", "font", "media"]
+
+BLOCKED_URL_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*mc.yandex.ru*",
+    "*doubleclick.net*",
+    "*connect.facebook.net*",
+    "*gravatar.com*",
+]
+
+# CDP Network.setBlockedURLs понимает только URL-шаблоны,
+# поэтому типы ресурсов для Selenium переводим в расширения файлов
+TYPE_URL_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.avif*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*"],
+}
+
+# Время загрузки страницы и байты, переданные по сети для неё и её ресурсов.
+# Выражение: для Selenium — через "return ...", для Playwright — page.evaluate.
+PAGE_STATS_EXPR = """(() => {
+    const nav = performance.getEntriesByType("navigation")[0];
+    let bytes = nav ? (nav.transferSize || 0) : 0;
+    for (const r of performance.getEntriesByType("resource")) bytes += r.transferSize || 0;
+    const end = nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd || nav.responseEnd) : 0;
+    return {load_ms: Math.round(end), bytes: bytes};
+})()"""
+
+
+def block_profile(config=None):
+    """
+    Профиль блокировки из конфига (с настройками по умолчанию).
+    None — блокировка выключена.
+    """
+    settings = dict((config or {}).get("block_resources") or {})
+    if not settings.get("enabled", True):
+        return None
+    return {
+        "types": list(settings.get("types", BLOCKED_RESOURCE_TYPES)),
+        "patterns": list(settings.get("patterns", BLOCKED_URL_PATTERNS)),
+        "eager": bool(settings.get("eager", True)),
+    }
+
+
+def selenium_blocked_urls(profile):
+    urls = list(profile["patterns"])
+    for rtype in profile["types"]:
+        urls.extend(TYPE_URL_PATTERNS.get(rtype, []))
+    return urls
+
+
+def apply_to_selenium(driver, profile):
+    """Блокировка через CDP Network.setBlockedURLs (только Chrome)"""
+    if not profile:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": selenium_blocked_urls(profile)})
+
+
+def apply_to_playwright(target, profile):
+    """Блокировка через route() на странице или контексте Playwright"""
+    if not profile:
+        return
+    types = set(profile["types"])
+    patterns = profile["patterns"]
+
+    def handler(route):
+        request = route.request
+        if request.resource_type in types or any(
+            fnmatch.fnmatch(request.url, pat) for pat in patterns
+        ):
+            route.abort()
+        else:
+            route.continue_()
+
+    target.route("**/*", handler)
+
+
+def selenium_page_stats(driver):
+    try:
+        return driver.execute_script("return " + PAGE_STATS_EXPR + ";") or {}
+    except Exception:
+        return {}
+
+
+def playwright_page_stats(page):
+    try:
+        return page.evaluate(PAGE_STATS_EXPR) or {}
+    except Exception:
+        return {}
+
+
+class LoadStats:
+    """Накопитель времени загрузки и трафика по страницам за прогон"""
+
+    def __init__(self):
+        self.pages = 0
+        self.load_ms = 0
+        self.bytes = 0
+
+    def add(self, stats):
+        if not stats or stats.get("load_ms") is None:
+            return
+        self.pages += 1
+        self.load_ms += int(stats.get("load_ms") or 0)
+        self.bytes += int(stats.get("bytes") or 0)
+
+    def summary(self):
+        if not self.pages:
+            return "нет данных о загрузке страниц"
+        return (
+            f"страниц: {self.pages}, среднее время загрузки: "
+            f"{self.load_ms // self.pages} мс, трафик: {self.bytes // 1024} КБ "
+            f"({self.bytes // 1024 // self.pages} КБ на страницу)"
+        )
+
+
+def format_page_stats(stats):
+    if not stats or stats.get("load_ms") is None:
+        return ""
+    return f"{stats['load_ms']} мс, {int(stats.get('bytes') or 0) // 1024} КБ"
@@ -1,16 +1,306 @@
 import re
+import json
 import time
+import queue
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
+from resource_blocking import apply_to_selenium, selenium_page_stats
+
+try:
+    import psutil
+except ImportError:
+    # Без psutil работает только перезапуск по числу записей
+    psutil = None
+
+
+SITE_URL = "https://api.itnelep.com/"
+LOGIN_URL = "https://api.itnelep.com/sign_in"
+FLOW_URL = "https://api.itnelep.com/user_flows/{}"
+
+# Путь к скачанному chromedriver — чтобы не проверять версии при каждом запуске
+DRIVER_PATH_FILE = "chromedriver_path.txt"
+_driver_lock = threading.Lock()
+
+# Cookies авторизованной сессии — переживают перезапуск браузера и приложения
+COOKIES_FILE = "itnelep_cookies.json"
+_cookies_lock = threading.Lock()
+
+# Перезапуск Chrome каждые N записей или при превышении памяти (МБ, все процессы
+# Chrome этого драйвера). 0 — не перезапускать. Переопределяется в config.json
+# ключами "recycle_every" и "memory_limit_mb".
+RECYCLE_EVERY = 150
+MEMORY_LIMIT_MB = 1500
+
+# Общий бюджет времени на одну запись (все ожидания process_record)
+RECORD_TIMEOUT = 15
+# Собственный бюджет на переключение фильтров каждого дополнительного пресета
+PRESET_TIMEOUT = 8
+# Ожидания вне записи (вход и т.п.)
+DEFAULT_WAIT = 20
+
+# Состояние фильтров только что открытой страницы
+NO_FILTERS = {"ready_2months": False, "old": False, "min_deposit": None}
+
+# Сколько максимум ждём реакции страницы на один фильтр
+FILTER_SETTLE_TIMEOUT = 10
+# Если за это время не начался ни один запрос и счётчик не изменился —
+# фильтр ничего не поменял, ждать дальше нечего (клик по переключателю)
+FILTER_QUIET_SEC = 0.5
+# Сколько страница должна простоять без запросов после их завершения
+FILTER_IDLE_MS = 250
+# То же для поля «мин. депозит»: ввод обычно уходит на сервер с задержкой
+# (debounce) и может дать запрос на каждую цифру
+FILTER_INPUT_QUIET_SEC = 1.5
+FILTER_INPUT_IDLE_MS = 700
+
+# Состояние фильтрации: текст filterCount и счётчики fetch/XHR страницы.
+# При первом вызове оборачивает fetch и XMLHttpRequest, чтобы считать запросы.
+FILTER_STATE_JS = """
+if (!window.__itnNet) {
+    const net = window.__itnNet = {started: 0, pending: 0, idleAt: performance.now()};
+    const done = () => {
+        net.pending = Math.max(0, net.pending - 1);
+        if (net.pending === 0) net.idleAt = performance.now();
+    };
+    if (window.fetch) {
+        const origFetch = window.fetch;
+        window.fetch = function () {
+            net.started++; net.pending++;
+            return origFetch.apply(this, arguments).finally(done);
+        };
+    }
+    const origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        net.started++; net.pending++;
+        this.addEventListener('loadend', done);
+        return origSend.apply(this, arguments);
+    };
+}
+const net = window.__itnNet;
+const el = document.querySelector("span[data-creeps-target='filterCount']");
+return {
+    count: el ? el.textContent : null,
+    started: net.started,
+    pending: net.pending,
+    idle_ms: net.pending ? 0 : performance.now() - net.idleAt,
+};
+"""
+
+# Все данные страницы user_flow за один round trip:
+# строки-метрики, текст filterCount и пары (имя, дата) подкрепов.
+# Возвращает null, пока блок метрик не отрисован.
+PAGE_DATA_JS = """
+const markers = ["Всего контактов", "Богатых", "Контактов Himera Finance", "Старых без отложки"];
+const lines = [];
+for (const p of document.querySelectorAll("p")) {
+    const text = p.innerText || "";
+    if (markers.some(m => text.includes(m))) lines.push(text);
+}
+if (!lines.some(t => t.includes(markers[0])) || !lines.some(t => t.includes(markers[1]))) {
+    return null;
+}
+const count = document.querySelector("span[data-creeps-target='filterCount']");
+const names = document.querySelectorAll("div.font-medium");
+const dates = document.querySelectorAll("div.text-xs.opacity-70");
+const supports = [];
+for (let i = 0; i < Math.min(names.length, dates.length); i++) {
+    supports.push([names[i].innerText, dates[i].innerText]);
+}
+return {lines: lines, filter_count: count ? count.innerText : null, supports: supports};
+"""
+
+
+def extract_rich(text):
+    """
+    '💰 Богатых (>1 500 000₽): 45 (старых: 34, молодых: 11)'
+    → 45
+    """
+    m = re.search(r"Богатых[^:]*:\s*([\d\s]+)", text)
+    if m:
+        digits = re.sub(r"\D", "", m.group(1))
+        if digits:
+            return int(digits)
+    return 0
+
+
+def extract_old_without_delay(text):
+    """
+    '👴 Старых без отложки (55+): 97 (с тг: 11)'
+    Нужно взять ЧИСЛО ПОСЛЕ ДВОЕТОЧИЯ → 97
+    а не первое число (55).
+    """
+    m = re.search(r"Старых без отложки.*?:\s*([\d\s]+)", text)
+    if m:
+        digits = re.sub(r"\D", "", m.group(1))
+        if digits:
+            return int(digits)
+
+    # Фоллбэк: если по какой-то причине не нашли — берём второе число
+    nums = re.findall(r"\d+", text)
+    if len(nums) >= 2:
+        return int(nums[1])
+    return 0
+
+
+def parse_metric_lines(lines):
+    """
+    Разбор строк-метрик страницы user_flow (тексты <p>) →
+    (total, rich, himera_finance, old_without_delay).
+    'Всего контактов' и 'Богатых' обязательны — без них страница
+    считается не загруженной.
+    """
+    def find(marker):
+        for line in lines:
+            if marker in line:
+                return line
+        return None
+
+    total_line = find("Всего контактов")
+    rich_line = find("Богатых")
+    if total_line is None or rich_line is None:
+        raise ValueError("на странице нет блока метрик")
+
+    total = int(re.findall(r"\d+", total_line)[-1])
+    rich = extract_rich(rich_line)
+
+    himera_line = find("Контактов Himera Finance")
+    nums = re.findall(r"\d+", himera_line or "")
+    himera_finance = int(nums[0]) if nums else 0
+
+    old_line = find("Старых без отложки")
+    old_without_delay = extract_old_without_delay(old_line) if old_line else 0
+
+    return total, rich, himera_finance, old_without_delay
+
+
+def parse_filter_count(text):
+    """'Показано контактов: 96' → 96"""
+    nums = re.findall(r"\d+", text or "")
+    return int(nums[-1]) if nums else 0
+
+
+def format_supports(pairs):
+    """Пары (имя, 'Последний подкреп: дата') → ['Имя — дата', ...]"""
+    res = []
+    for name, date in pairs:
+        nm = (name or "").strip()
+        dt = (date or "").replace("Последний подкреп:", "").strip()
+        if nm and dt:
+            res.append(f"{nm} — {dt}")
+    return res
+
+
+def error_result(e):
+    """Результат process_record для записи, которую не удалось обработать"""
+    return {
+        "total": None,
+        "rich": None,
+        "filtered": None,
+        "filtered_presets": [],
+        "himera_finance": None,
+        "old_without_delay": None,
+        "supports": [],
+        "status": f"Ошибка: {e}",
+    }
+
+
+def resolve_chromedriver(refresh=False):
+    """
+    Путь к chromedriver. Берётся из DRIVER_PATH_FILE, если файл
+    по этому пути ещё существует (работает офлайн); иначе —
+    ChromeDriverManager().install() и путь сохраняется.
+    """
+    with _driver_lock:
+        p = Path(DRIVER_PATH_FILE)
+        if not refresh:
+            try:
+                cached = p.read_text(encoding="utf-8").strip()
+                if cached and Path(cached).exists():
+                    return cached
+            except Exception:
+                pass
+
+        path = ChromeDriverManager().install()
+        try:
+            p.write_text(path, encoding="utf-8")
+        except Exception:
+            pass
+        return path
+
+
+def load_cookies(path=COOKIES_FILE):
+    try:
+        p = Path(path)
+        if p.exists():
+            data = json.loads(p.read_text(encoding="utf-8"))
+            if isinstance(data, list):
+                return data
+    except Exception:
+        pass
+    return []
+
+
+def save_cookies(cookies, path=COOKIES_FILE):
+    with _cookies_lock:
+        try:
+            p = Path(path)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(cookies, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp.replace(p)
+        except Exception:
+            pass
+
+
+class StageTimeout(Exception):
+    """Бюджет времени записи закончился на этапе stage"""
+
+    def __init__(self, stage):
+        super().__init__(f"таймаут на этапе «{stage}»")
+        self.stage = stage
+
+
+class SessionExpired(Exception):
+    """Сайт вернул страницу входа вместо запрошенной"""
+
+    def __init__(self):
+        super().__init__("сессия истекла")
+
 
 class Scraper:
-    def __init__(self, headless: bool = False):
+    def __init__(self, headless: bool = False, record_timeout: float = RECORD_TIMEOUT,
+                 cookies_file: str = COOKIES_FILE, block=None,
+                 recycle_every: int = RECYCLE_EVERY, memory_limit_mb: int = MEMORY_LIMIT_MB):
+        self.headless = headless
+        self.block = block
+        self.record_timeout = record_timeout
+        self._deadline = None
+        self._credentials = None
+        self._logged_in = False
+        self.cookies_file = cookies_file
+
+        # Перезапуск браузера в длинных прогонах
+        self.recycle_every = recycle_every
+        self.memory_limit_mb = memory_limit_mb
+        self.records = 0
+        self.recycles = 0
+        self.peak_memory_mb = 0
+        self._broken = False
+
+        self._start_driver()
+
+    def _start_driver(self):
+        headless = self.headless
+        block = self.block
         options = Options()
         options.add_argument("--window-size=1500,1000")
         options.add_argument("--disable-extensions")
@@ -23,14 +313,154 @@ class Scraper:
             options.add_argument("--disable-gpu")
             options.add_argument("--no-sandbox")
 
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.wait = WebDriverWait(self.driver, 20)
+        # Данные читаем только после явных ожиданий элементов,
+        # поэтому ждать загрузки картинок и т.п. не нужно
+        if block and block.get("eager"):
+            options.page_load_strategy = "eager"
+
+        try:
+            service = Service(resolve_chromedriver())
+            self.driver = webdriver.Chrome(service=service, options=options)
+        except WebDriverException:
+            # Chrome обновился и кэшированный драйвер к нему не подходит
+            service = Service(resolve_chromedriver(refresh=True))
+            self.driver = webdriver.Chrome(service=service, options=options)
+        try:
+            apply_to_selenium(self.driver, block)
+        except Exception:
+            pass
+        self._restore_cookies()
+
+    def memory_mb(self):
+        """RSS всех процессов Chrome этого драйвера, МБ (0 — без psutil)"""
+        if psutil is None:
+            return 0
+        try:
+            driver_proc = psutil.Process(self.driver.service.process.pid)
+            total = sum(
+                proc.memory_info().rss
+                for proc in driver_proc.children(recursive=True)
+            )
+            return total // (1024 * 1024)
+        except Exception:
+            return 0
+
+    def recycle(self):
+        """
+        Перезапуск Chrome. Cookies текущей сессии сохраняются и подставляются
+        в новый браузер, поэтому повторный вход обычно не нужен; если сессия
+        всё же потеряна — сработает обычный перевход по SessionExpired.
+        """
+        if self._logged_in:
+            try:
+                save_cookies(self.driver.get_cookies(), self.cookies_file)
+            except Exception:
+                pass
+        self.quit()
+        self.records = 0
+        self.recycles += 1
+        self._start_driver()
+
+    def _after_record(self):
+        """Учёт записи; перезапуск, если пора по счётчику или по памяти"""
+        self.records += 1
+        memory = self.memory_mb()
+        self.peak_memory_mb = max(self.peak_memory_mb, memory)
+        if (self.recycle_every and self.records >= self.recycle_every) or (
+            self.memory_limit_mb and memory > self.memory_limit_mb
+        ):
+            try:
+                self.recycle()
+            except Exception:
+                # Chrome не запустился — попробуем перед следующей записью
+                self._broken = True
+
+    def _restore_cookies(self):
+        """
+        Подставляет сохранённые cookies через CDP — без перехода на сайт,
+        поэтому это можно сделать сразу после запуска браузера.
+        """
+        cookies = []
+        for c in load_cookies(self.cookies_file):
+            cookie = {
+                k: c[k]
+                for k in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite")
+                if k in c
+            }
+            if "expiry" in c:
+                cookie["expires"] = c["expiry"]
+            cookies.append(cookie)
+        if not cookies:
+            return
+        try:
+            self.driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        except Exception:
+            pass
+
+    def _remaining(self):
+        """Сколько секунд осталось у текущей записи"""
+        if self._deadline is None:
+            return DEFAULT_WAIT
+        return self._deadline - time.monotonic()
+
+    def _wait_for(self, stage, condition, timeout=None, poll=0.5):
+        """
+        WebDriverWait в пределах бюджета записи. Если бюджет кончился —
+        StageTimeout с названием этапа; если истёк только собственный
+        timeout ожидания — обычный TimeoutException.
+        """
+        remaining = self._remaining()
+        if remaining <= 0:
+            raise StageTimeout(stage)
+        limit = remaining if timeout is None else min(timeout, remaining)
+        try:
+            return WebDriverWait(self.driver, limit, poll_frequency=poll).until(condition)
+        except TimeoutException:
+            if self._remaining() <= 0 or limit == remaining:
+                raise StageTimeout(stage)
+            raise
+
+    def _get(self, url, stage="загрузка страницы"):
+        remaining = self._remaining()
+        if remaining <= 0:
+            raise StageTimeout(stage)
+        self.driver.set_page_load_timeout(remaining)
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            raise StageTimeout(stage)
+
+    def _on_sign_in(self):
+        """Открыта страница входа (редирект на /sign_in или форма логина)"""
+        try:
+            return bool(self.driver.execute_script(
+                "return location.pathname.includes('sign_in')"
+                " || !!document.getElementById('session_name');"
+            ))
+        except Exception:
+            return False
+
+    def session_alive(self):
+        """
+        Дешёвая проверка авторизации. Если браузер уже стоит на странице
+        сайта после входа — без навигации; иначе один переход на главную
+        (неавторизованного она сама отправит на страницу входа).
+        """
+        if self._logged_in and self.driver.current_url.startswith(SITE_URL) and not self._on_sign_in():
+            return True
+        self._get(SITE_URL, "вход")
+        self._logged_in = not self._on_sign_in()
+        return self._logged_in
 
     def login(self, username, password):
-        self.driver.get("https://api.itnelep.com/sign_in")
+        """Вход на сайт; пропускается, если сессия (или cookies с диска) ещё действует"""
+        self._credentials = (username, password)
+        if self.session_alive():
+            return
+        if "sign_in" not in self.driver.current_url:
+            self._get(LOGIN_URL, "вход")
 
-        name = self.wait.until(EC.presence_of_element_located((By.ID, "session_name")))
+        name = self._wait_for("вход", EC.presence_of_element_located((By.ID, "session_name")))
         pwd = self.driver.find_element(By.ID, "session_password")
 
         name.clear()
@@ -39,131 +469,111 @@ class Scraper:
         pwd.send_keys(password)
         pwd.submit()
 
-        self.wait.until_not(EC.url_contains("sign_in"))
+        self._wait_for("вход", lambda d: "sign_in" not in d.current_url)
+        self._logged_in = True
+        save_cookies(self.driver.get_cookies(), self.cookies_file)
 
-    def _read_filter_count(self):
-        """
-        Читает:
-        <span data-creeps-target="filterCount">Показано контактов: 96</span>
-        и возвращает 96.
-        """
-        try:
-            el = self.wait.until(
-                EC.presence_of_element_located(
-                    (By.XPATH, "//span[@data-creeps-target='filterCount']")
-                )
-            )
-            nums = re.findall(r"\d+", el.text)
-            return int(nums[-1]) if nums else 0
-        except:
-            return 0
+    def _filter_state(self):
+        return self.driver.execute_script(FILTER_STATE_JS)
 
-    def _extract_rich(self, text):
+    def _wait_filter_settled(self, before, quiet_sec=FILTER_QUIET_SEC, idle_ms=FILTER_IDLE_MS):
         """
-        '💰 Богатых (>1 500 000₽): 45 (старых: 34, молодых: 11)'
-        → 45
-        """
-        m = re.search(r"Богатых[^:]*:\s*([\d\s]+)", text)
-        if m:
-            digits = re.sub(r"\D", "", m.group(1))
-            if digits:
-                return int(digits)
-        return 0
-
-    def _extract_first_number_by_xpath(self, xpath):
-        """
-        Универсальный помощник: берёт ПЕРВОЕ число в тексте элемента.
-        Используем, например, для 'Контактов Himera Finance: 142'
+        Ждём, пока страница отреагирует на фильтр: изменился filterCount
+        или запустились запросы — и все запросы завершились, а страница
+        простояла без них idle_ms. Промежуточный счётчик, пока запросы
+        ещё идут (ввод по цифре), не принимается. Если за quiet_sec ничего
+        не началось — фильтр ничего не поменял. Вместо фиксированных пауз.
         """
+        started_at = time.monotonic()
+
+        def settled(driver):
+            state = self._filter_state()
+            if state["count"] != before["count"] or state["started"] > before["started"]:
+                if state["pending"] == 0 and state["idle_ms"] >= idle_ms:
+                    return state
+                return False
+            if time.monotonic() - started_at >= quiet_sec:
+                return state
+            return False
+
         try:
-            el = self.wait.until(
-                EC.presence_of_element_located((By.XPATH, xpath))
+            return self._wait_for(
+                "ожидание фильтра", settled, timeout=FILTER_SETTLE_TIMEOUT, poll=0.1
             )
-            nums = re.findall(r"\d+", el.text)
-            return int(nums[0]) if nums else 0
-        except:
-            return 0
+        except TimeoutException:
+            return self._filter_state()
 
-    def _extract_old_without_delay(self):
-        """
-        Специальный разбор строки:
-        '👴 Старых без отложки (55+): 97 (с тг: 11)'
-        Нужно взять ЧИСЛО ПОСЛЕ ДВОЕТОЧИЯ → 97
-        а не первое число (55).
-        """
+    def _click_filter(self, element_id):
+        state = self._filter_state()
         try:
-            el = self.wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//p[contains(@class,'text-base-content') and contains(text(),'Старых без отложки')]",
-                    )
-                )
+            elem = self._wait_for(
+                f"фильтр {element_id}",
+                EC.element_to_be_clickable((By.ID, element_id)),
             )
-            text = el.text
-            # Ищем именно число после двоеточия
-            m = re.search(r"Старых без отложки.*?:\s*([\d\s]+)", text)
-            if m:
-                digits = re.sub(r"\D", "", m.group(1))
-                if digits:
-                    return int(digits)
-
-            # Фоллбэк: если по какой-то причине не нашли — берём второе число
-            nums = re.findall(r"\d+", text)
-            if len(nums) >= 2:
-                return int(nums[1])
-            return 0
-        except:
-            return 0
+            self.driver.execute_script("arguments[0].click();", elem)
+        except StageTimeout:
+            raise
+        except Exception:
+            return state
+        return self._wait_filter_settled(state)
 
-    def apply_filters(self, flt):
+    def _switch_filters(self, current, flt):
         """
-        Применяем фильтры на странице и возвращаем количество контактов
-        после фильтрации (по span[data-creeps-target="filterCount"]).
+        Переключает фильтры страницы из состояния current в flt,
+        кликая только по тем, что отличаются (фильтры — переключатели).
+        Возвращает новое состояние.
         """
+        want = {
+            "ready_2months": bool(flt.get("ready_2months", True)),
+            "old": bool(flt.get("old")),
+            "min_deposit": flt.get("min_deposit"),
+        }
+
         # Базовый фильтр 2 месяца + ошибки
-        try:
-            elem = self.wait.until(
-                EC.element_to_be_clickable((By.ID, "filter-combined-ready-2months"))
-            )
-            self.driver.execute_script("arguments[0].click();", elem)
-        except:
-            pass
-        time.sleep(2)
+        if want["ready_2months"] != current["ready_2months"]:
+            self._click_filter("filter-combined-ready-2months")
 
-        if flt.get("old"):
-            try:
-                elem = self.wait.until(
-                    EC.element_to_be_clickable((By.ID, "filter-old"))
-                )
-                self.driver.execute_script("arguments[0].click();", elem)
-            except:
-                pass
-            time.sleep(2)
+        if want["old"] != current["old"]:
+            self._click_filter("filter-old")
 
-        if flt.get("min_deposit") is not None:
-            try:
-                elem = self.wait.until(
-                    EC.element_to_be_clickable((By.ID, "filter-min-deposits"))
-                )
-                self.driver.execute_script("arguments[0].click();", elem)
-            except:
-                pass
-            time.sleep(2)
+        if (want["min_deposit"] is None) != (current["min_deposit"] is None):
+            self._click_filter("filter-min-deposits")
 
+        if want["min_deposit"] is not None and want["min_deposit"] != current["min_deposit"]:
             try:
-                fld = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "min-deposits-amount"))
+                fld = self._wait_for(
+                    "мин. депозит",
+                    EC.presence_of_element_located((By.ID, "min-deposits-amount")),
                 )
+                state = self._filter_state()
                 fld.clear()
-                fld.send_keys(str(flt["min_deposit"]))
-            except:
+                fld.send_keys(str(want["min_deposit"]))
+                self._wait_filter_settled(
+                    state, quiet_sec=FILTER_INPUT_QUIET_SEC, idle_ms=FILTER_INPUT_IDLE_MS
+                )
+            except StageTimeout:
+                raise
+            except Exception:
                 pass
 
-        time.sleep(5)
-        return self._read_filter_count()
+        return want
+
+    def apply_filters(self, flt):
+        """
+        Применяем фильтры на странице и возвращаем количество контактов
+        после фильтрации (по span[data-creeps-target="filterCount"]).
+        """
+        self._switch_filters(NO_FILTERS, flt)
+        return parse_filter_count(self._filter_state()["count"])
+
+    def extract_page(self):
+        """
+        Один execute_script вместо отдельного ожидания/чтения
+        каждого элемента: метрики, filterCount и подкрепы сразу.
+        """
+        return self._wait_for("метрики", lambda d: d.execute_script(PAGE_DATA_JS))
 
-    def parse_metrics(self):
+    def parse_metrics(self, page=None):
         """
         Читаем:
 
@@ -172,87 +582,184 @@ class Scraper:
         🪙 Контактов Himera Finance: 142
         👴 Старых без отложки (55+): 97 (с тг: 11)
         """
-        # 👥 Всего контактов
-        total_el = self.wait.until(
-            EC.presence_of_element_located(
-                (By.XPATH, "//p[contains(text(),'Всего контактов')]")
-            )
-        )
-        total = int(re.findall(r"\d+", total_el.text)[-1])
-
-        # 💰 Богатых (>1 500 000₽)
-        rich_el = self.wait.until(
-            EC.presence_of_element_located(
-                (
-                    By.XPATH,
-                    "//p[contains(@class,'text-base-content') and contains(text(),'Богатых')]",
-                )
-            )
-        )
-        rich = self._extract_rich(rich_el.text)
-
-        # 🪙 Контактов Himera Finance: 142  → берём первое число
-        himera_finance = self._extract_first_number_by_xpath(
-            "//p[contains(@class,'text-base-content') and contains(text(),'Контактов Himera Finance')]"
-        )
-
-        # 👴 Старых без отложки (55+): 97 (с тг: 11) → берём число после двоеточия
-        old_without_delay = self._extract_old_without_delay()
+        page = page or self.extract_page()
+        return parse_metric_lines(page["lines"])
 
-        return total, rich, himera_finance, old_without_delay
-
-    def parse_supports(self):
+    def parse_supports(self, page=None):
         """
         Собираем подкрепы: Имя — дата
         """
         try:
-            names = self.driver.find_elements(By.CSS_SELECTOR, "div.font-medium")
-            dates = self.driver.find_elements(
-                By.CSS_SELECTOR, "div.text-xs.opacity-70"
-            )
-
-            res = []
-            for n, d in zip(names, dates):
-                nm = n.text.strip()
-                dt = d.text.replace("Последний подкреп:", "").strip()
-                if nm and dt:
-                    res.append(f"{nm} — {dt}")
-            return res
+            page = page or self.extract_page()
+            return format_supports(page["supports"])
         except:
             return []
 
     def process_record(self, inn, userflow_id, filters):
+        return self.process_record_presets(inn, userflow_id, [filters])
+
+    def process_record_presets(self, inn, userflow_id, presets):
+        """
+        Как process_record, но за один заход на страницу считает
+        filterCount для каждого набора фильтров из presets
+        (переключая фильтры на месте). Метрики и подкрепы читаются
+        при первом наборе; "filtered_presets" — счётчики по порядку presets
+        (None — дополнительный пресет не уложился в PRESET_TIMEOUT).
+
+        Если сессия истекла, входит заново с сохранёнными логином
+        и паролем и повторяет запись один раз.
+        """
+        if self._broken:
+            try:
+                self._start_driver()
+                self._broken = False
+            except Exception as e:
+                return error_result(e)
         try:
-            self.driver.get(f"https://api.itnelep.com/user_flows/{userflow_id}")
-            self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+            return self._record_presets(userflow_id, presets)
+        finally:
+            self._after_record()
+
+    def _record_presets(self, userflow_id, presets):
+        try:
+            return self._process_presets(userflow_id, presets)
+        except SessionExpired as e:
+            self._logged_in = False
+            if not self._credentials:
+                return error_result(e)
+            try:
+                self.login(*self._credentials)
+                return self._process_presets(userflow_id, presets)
+            except Exception as e:
+                return error_result(e)
+        except Exception as e:
+            return error_result(e)
+
+    def _process_presets(self, userflow_id, presets):
+        self._deadline = time.monotonic() + self.record_timeout
+        try:
+            self._get(FLOW_URL.format(userflow_id))
+            if self._on_sign_in():
+                raise SessionExpired()
+            self._wait_for(
+                "загрузка страницы",
+                EC.presence_of_element_located((By.TAG_NAME, "body")),
+            )
+
+            state = self._switch_filters(NO_FILTERS, presets[0])
+            page = self.extract_page()
+            filtered = parse_filter_count(page["filter_count"])
+            total, rich, himera_finance, old_without_delay = self.parse_metrics(page)
+            supports = self.parse_supports(page)
+            stats = selenium_page_stats(self.driver)
 
-            filtered = self.apply_filters(filters)
-            total, rich, himera_finance, old_without_delay = self.parse_metrics()
-            supports = self.parse_supports()
+            counts = [filtered]
+            for i, flt in enumerate(presets[1:], start=1):
+                # У каждого пресета свой бюджет: основной результат уже прочитан
+                self._deadline = time.monotonic() + PRESET_TIMEOUT
+                try:
+                    state = self._switch_filters(state, flt)
+                    counts.append(parse_filter_count(self._filter_state()["count"]))
+                except StageTimeout:
+                    # Состояние фильтров на странице неизвестно — остальные
+                    # пресеты без счётчика (их колонка G не перезаписывается)
+                    counts.extend([None] * (len(presets) - i))
+                    break
 
             return {
                 "total": total,
                 "rich": rich,
                 "filtered": filtered,
+                "filtered_presets": counts,
                 "himera_finance": himera_finance,
                 "old_without_delay": old_without_delay,
                 "supports": supports,
+                "load_ms": stats.get("load_ms"),
+                "bytes": stats.get("bytes"),
                 "status": "OK",
             }
 
-        except Exception as e:
-            return {
-                "total": None,
-                "rich": None,
-                "filtered": None,
-                "himera_finance": None,
-                "old_without_delay": None,
-                "supports": [],
-                "status": f"Ошибка: {e}",
-            }
+        except StageTimeout:
+            # Страница могла уйти на вход уже после загрузки
+            if self._on_sign_in():
+                raise SessionExpired()
+            raise
+        finally:
+            self._deadline = None
 
     def quit(self):
         try:
             self.driver.quit()
         except:
             pass
+
+
+class ScraperPool:
+    """
+    Пул из нескольких Scraper (по одному Chrome на каждый).
+    Каждая запись обрабатывается первым свободным браузером,
+    поэтому process_record можно вызывать из нескольких потоков.
+    """
+
+    def __init__(self, size: int = 3, headless: bool = False, block=None,
+                 recycle_every: int = RECYCLE_EVERY, memory_limit_mb: int = MEMORY_LIMIT_MB):
+        self.size = max(1, int(size))
+        self.headless = headless
+        self.block = block
+        self.scrapers = []
+
+        # Браузеры запускаем параллельно — холодный старт Chrome долгий
+        with ThreadPoolExecutor(max_workers=self.size) as ex:
+            futures = [
+                ex.submit(
+                    Scraper, headless, block=block,
+                    recycle_every=recycle_every, memory_limit_mb=memory_limit_mb,
+                )
+                for _ in range(self.size)
+            ]
+        errors = []
+        for fut in futures:
+            try:
+                self.scrapers.append(fut.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            self.quit()
+            raise errors[0]
+
+        self._free = queue.Queue()
+        for scraper in self.scrapers:
+            self._free.put(scraper)
+
+    def __len__(self):
+        return len(self.scrapers)
+
+    def login(self, username, password):
+        with ThreadPoolExecutor(max_workers=len(self.scrapers)) as ex:
+            list(ex.map(lambda s: s.login(username, password), self.scrapers))
+
+    def process_record(self, inn, userflow_id, filters):
+        return self.process_record_presets(inn, userflow_id, [filters])
+
+    def process_record_presets(self, inn, userflow_id, presets):
+        scraper = self._free.get()
+        try:
+            return scraper.process_record_presets(inn, userflow_id, presets)
+        finally:
+            self._free.put(scraper)
+
+    def memory_stats(self):
+        """Перезапуски браузеров и пик памяти одного Chrome с reset_memory_stats"""
+        return {
+            "recycles": sum(s.recycles for s in self.scrapers),
+            "peak_memory_mb": max((s.peak_memory_mb for s in self.scrapers), default=0),
+        }
+
+    def reset_memory_stats(self):
+        for scraper in self.scrapers:
+            scraper.recycles = 0
+            scraper.peak_memory_mb = 0
+
+    def quit(self):
+        for scraper in self.scrapers:
+            scraper.quit()
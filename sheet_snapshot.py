@@ -0,0 +1,193 @@
+"""
+Локальный снимок таблицы (SQLite, sheets_snapshot.db) для мгновенного старта.
+
+Хранит список листов и значения каждого загруженного листа вместе
+с ревизией таблицы (version файла в Drive). Вкладки сразу показывают
+данные из снимка, а sync() в фоне сверяет ревизию: если таблица
+не менялась — ничего не скачивается; если менялась — все листы снимка
+приходят одним values.batchGet, и обновляются только листы,
+содержимое которых действительно изменилось.
+
+cells ограничивает снимок диапазоном внутри листа ("A2:A") — хранится
+и скачивается только он. Снимок с другим диапазоном при открытии
+сбрасывается: это кэш, данные подтянутся при следующей сверке.
+"""
+
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+
+
+SNAPSHOT_DB_FILE = "sheets_snapshot.db"
+
+
+def values_hash(values):
+    return hashlib.sha1(
+        json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class SnapshotStore:
+    def __init__(self, path=SNAPSHOT_DB_FILE, cells=None):
+        self.path = path
+        self.cells = cells
+        self._lock = threading.Lock()
+        # Читает GUI, пишет фоновая сверка — соединение общее под блокировкой
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spreadsheets (
+                    spreadsheet_id TEXT PRIMARY KEY,
+                    revision TEXT,
+                    titles TEXT,
+                    checked_at REAL
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheets (
+                    spreadsheet_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (spreadsheet_id, title)
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            layout = self.cells or ""
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'cells'").fetchone()
+            if row is None or row[0] != layout:
+                # Значения сохранены для другого диапазона — сверка скачает заново
+                self.conn.execute("DELETE FROM sheets")
+                self.conn.execute("UPDATE spreadsheets SET revision = NULL")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('cells', ?)", (layout,)
+                )
+
+    def revision(self, spreadsheet_id):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT revision FROM spreadsheets WHERE spreadsheet_id = ?", (spreadsheet_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def titles(self, spreadsheet_id):
+        """Список листов из снимка или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT titles FROM spreadsheets WHERE spreadsheet_id = ?", (spreadsheet_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def set_meta(self, spreadsheet_id, revision=None, titles=None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO spreadsheets (spreadsheet_id) VALUES (?)", (spreadsheet_id,)
+            )
+            if revision is not None:
+                self.conn.execute(
+                    "UPDATE spreadsheets SET revision = ?, checked_at = ? WHERE spreadsheet_id = ?",
+                    (revision, time.time(), spreadsheet_id),
+                )
+            if titles is not None:
+                self.conn.execute(
+                    "UPDATE spreadsheets SET titles = ? WHERE spreadsheet_id = ?",
+                    (json.dumps(titles, ensure_ascii=False), spreadsheet_id),
+                )
+
+    def sheet_titles(self, spreadsheet_id):
+        """Листы, значения которых есть в снимке"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT title FROM sheets WHERE spreadsheet_id = ?", (spreadsheet_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def values(self, spreadsheet_id, title):
+        """Значения листа из снимка или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM sheets WHERE spreadsheet_id = ? AND title = ?",
+                (spreadsheet_id, title),
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put_values(self, spreadsheet_id, title, values):
+        """Сохранить значения листа. True — содержимое изменилось."""
+        digest = values_hash(values)
+        data = zlib.compress(json.dumps(values, ensure_ascii=False).encode("utf-8"))
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT hash FROM sheets WHERE spreadsheet_id = ? AND title = ?",
+                (spreadsheet_id, title),
+            ).fetchone()
+            if row and row[0] == digest:
+                self.conn.execute(
+                    "UPDATE sheets SET fetched_at = ? WHERE spreadsheet_id = ? AND title = ?",
+                    (time.time(), spreadsheet_id, title),
+                )
+                return False
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sheets (spreadsheet_id, title, hash, data, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (spreadsheet_id, title, digest, data, time.time()),
+            )
+            return True
+
+    def drop_sheets(self, spreadsheet_id, titles):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM sheets WHERE spreadsheet_id = ? AND title = ?",
+                [(spreadsheet_id, title) for title in titles],
+            )
+
+    def sync(self, gs):
+        """
+        Сверка снимка с таблицей (GoogleSheetsAPI gs). Возвращает
+        (список листов, изменившиеся листы); при той же ревизии —
+        (список из снимка, []) без скачивания значений. Если ревизию
+        получить не удалось, листы и значения скачиваются как при изменении.
+        """
+        sid = gs.spreadsheet_id
+        try:
+            revision = gs.revision()
+        except Exception:
+            # Drive API недоступен (не включён, 403, нет сети) — без ревизии
+            # не понять, свежий ли снимок, поэтому скачиваем листы заново
+            revision = None
+        titles = self.titles(sid)
+        if revision is not None and titles is not None and revision == self.revision(sid):
+            self.set_meta(sid, revision=revision)
+            return titles, []
+
+        gs.refresh()
+        titles = gs.get_sheet_names()
+        cached = self.sheet_titles(sid)
+        gone = [t for t in cached if t not in titles]
+        if gone:
+            self.drop_sheets(sid, gone)
+        changed = []
+        wanted = [t for t in cached if t in titles]
+        for title, values in gs.get_sheets_values(wanted, self.cells).items():
+            if self.put_values(sid, title, values):
+                changed.append(title)
+        # Ревизию сохраняем последней: если что-то упало, сверка повторится
+        self.set_meta(sid, revision=revision, titles=titles)
+        return titles, changed
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
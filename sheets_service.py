@@ -0,0 +1,123 @@
+"""
+Общий на весь процесс доступ к Google Sheets.
+
+Один авторизованный клиент gspread на файл сервисного аккаунта
+и кэш объектов таблиц и листов: open_by_key() и worksheet() каждый
+раз запрашивают метаданные таблицы, поэтому вкладки берут их отсюда.
+
+    service = get_service("service_account.json")
+    ws = service.worksheet(spreadsheet_id, "Айди")
+    service.invalidate(spreadsheet_id)   # листы переименовали/добавили
+"""
+
+import threading
+
+import gspread
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession
+
+
+# Метаданные файла таблицы в Drive: version растёт при каждом изменении
+DRIVE_FILE_URL = "https://www.googleapis.com/drive/v3/files/{}"
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_service(creds_file):
+    """SheetsService для файла сервисного аккаунта (один на процесс)"""
+    with _services_lock:
+        service = _services.get(creds_file)
+        if service is None:
+            service = SheetsService(creds_file)
+            _services[creds_file] = service
+        return service
+
+
+def reset_services():
+    """Забыть всех клиентов — например, после смены файла ключей в настройках"""
+    with _services_lock:
+        _services.clear()
+
+
+class SheetsService:
+    def __init__(self, creds_file):
+        self.credentials = Credentials.from_service_account_file(creds_file, scopes=SCOPES)
+        self.client = gspread.authorize(self.credentials)
+        self._drive = None
+        self._lock = threading.RLock()
+        self._spreadsheets = {}
+        # {spreadsheet_id: {название листа: Worksheet}} — по порядку листов
+        self._worksheets = {}
+
+    def spreadsheet(self, spreadsheet_id):
+        with self._lock:
+            sh = self._spreadsheets.get(spreadsheet_id)
+            if sh is None:
+                sh = self.client.open_by_key(spreadsheet_id)
+                self._spreadsheets[spreadsheet_id] = sh
+            return sh
+
+    def _worksheet_map(self, spreadsheet_id):
+        with self._lock:
+            sheets = self._worksheets.get(spreadsheet_id)
+            if sheets is None:
+                # Один запрос метаданных на все листы таблицы
+                sheets = {ws.title: ws for ws in self.spreadsheet(spreadsheet_id).worksheets()}
+                self._worksheets[spreadsheet_id] = sheets
+            return sheets
+
+    def worksheet(self, spreadsheet_id, title):
+        sheets = self._worksheet_map(spreadsheet_id)
+        ws = sheets.get(title)
+        if ws is None:
+            # Лист мог появиться после заполнения кэша
+            with self._lock:
+                self._worksheets.pop(spreadsheet_id, None)
+            ws = self._worksheet_map(spreadsheet_id).get(title)
+        if ws is None:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return ws
+
+    def worksheets(self, spreadsheet_id):
+        return list(self._worksheet_map(spreadsheet_id).values())
+
+    def worksheet_titles(self, spreadsheet_id, include_hidden=True):
+        titles = []
+        for ws in self.worksheets(spreadsheet_id):
+            props = getattr(ws, "_properties", {}) or {}
+            if include_hidden or not props.get("hidden", False):
+                titles.append(ws.title)
+        return titles
+
+    def revision(self, spreadsheet_id):
+        """
+        Ревизия таблицы (version файла в Drive) — одним лёгким запросом,
+        без скачивания данных. Меняется при любом изменении таблицы.
+        """
+        with self._lock:
+            if self._drive is None:
+                self._drive = AuthorizedSession(self.credentials)
+        resp = self._drive.get(
+            DRIVE_FILE_URL.format(spreadsheet_id),
+            params={"fields": "version,modifiedTime", "supportsAllDrives": "true"},
+            timeout=30,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        return str(data.get("version") or data.get("modifiedTime") or "")
+
+    def invalidate(self, spreadsheet_id=None):
+        """Сбросить кэш листов одной таблицы или всех"""
+        with self._lock:
+            if spreadsheet_id is None:
+                self._spreadsheets.clear()
+                self._worksheets.clear()
+            else:
+                self._spreadsheets.pop(spreadsheet_id, None)
+                self._worksheets.pop(spreadsheet_id, None)
@@ -6,6 +6,7 @@
 
 import json
 import re
+import time
 import unicodedata
 import multiprocessing as mp
 from pathlib import Path
@@ -14,8 +15,6 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 import requests
-import gspread
-from google.oauth2.service_account import Credentials
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
@@ -30,6 +29,16 @@ from PyQt5.QtGui import QColor, QGuiApplication
 
 from playwright.sync_api import sync_playwright
 
+from resource_blocking import block_profile, apply_to_playwright, playwright_page_stats, format_page_stats
+from sheets_service import get_service
+from inn_index import get_inn_index
+
+# ИНН не найден, а маппингу больше стольких секунд — перечитать его один раз
+FLOW_INDEX_MISS_RELOAD_SECONDS = 60
+# Ревизия таблицы для индекса дат перепроверяется не чаще раза в N секунд
+DATE_INDEX_REVISION_TTL = 45
+
+
 # Optional: morphological inflection
 try:
     import pymorphy2
@@ -334,64 +343,99 @@ def build_messages(name: str, post: str, org: str) -> List[str]:
 # GOOGLE SHEETS CLIENT
 # ===========================
 
+def normalize_date(text: str) -> str:
+    """'1.2.2025', '01.02.25', '2025-02-01' → '01.02.2025'; прочее — как есть"""
+    t = (text or "").strip()
+    m = re.match(r"^(\d{1,2})[./-](\d{1,2})[./-](\d{4}|\d{2})$", t)
+    if m:
+        day, month, year = m.groups()
+    else:
+        m = re.match(r"^(\d{4})-(\d{1,2})-(\d{1,2})$", t)
+        if not m:
+            return t
+        year, month, day = m.groups()
+    if len(year) == 2:
+        year = "20" + year
+    return f"{int(day):02d}.{int(month):02d}.{year}"
+
+
 class SheetsClient:
+    """Чтение таблиц через общий на процесс клиент (sheets_service)"""
+
     def __init__(self, service_account_path: str):
-        scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
-        creds = Credentials.from_service_account_file(service_account_path, scopes=scopes)
-        self.gc = gspread.authorize(creds)
+        self.service_account_path = service_account_path
+        self.service = get_service(service_account_path)
+        # {(spreadsheet_id, лист): (ревизия таблицы, {дата: {ИНН}})}
+        self._date_indexes: Dict[Tuple[str, str], Tuple[str, Dict[str, set]]] = {}
+        # {spreadsheet_id: (ревизия, когда проверена)}
+        self._revisions: Dict[str, Tuple[str, float]] = {}
 
     def list_worksheets(self, spreadsheet_id: str) -> List[str]:
-        sh = self.gc.open_by_key(spreadsheet_id)
-        titles: List[str] = []
+        # Кнопка «загрузить листы» — перечитываем список, а не берём из кэша
+        self.service.invalidate(spreadsheet_id)
+        self._date_indexes = {k: v for k, v in self._date_indexes.items() if k[0] != spreadsheet_id}
+        self._revisions.pop(spreadsheet_id, None)
+        return self.service.worksheet_titles(spreadsheet_id, include_hidden=False)
+
+    def revision(self, spreadsheet_id: str) -> Optional[str]:
+        """
+        Ревизия таблицы; несколько запросов подряд в пределах
+        DATE_INDEX_REVISION_TTL отвечаются из памяти, без запроса к Drive.
+        None — получить не удалось.
+        """
+        cached = self._revisions.get(spreadsheet_id)
+        if cached and time.monotonic() - cached[1] < DATE_INDEX_REVISION_TTL:
+            return cached[0]
         try:
-            meta = sh.fetch_sheet_metadata()
-            for sheet in meta.get("sheets", []):
-                props = (sheet or {}).get("properties", {}) or {}
-                title = (props.get("title") or "").strip()
-                hidden = bool(props.get("hidden", False))
-                if title and not hidden:
-                    titles.append(title)
+            revision = self.service.revision(spreadsheet_id)
         except Exception:
-            titles = []
-
-        if not titles:
-            try:
-                for ws in sh.worksheets():
-                    props = getattr(ws, "_properties", {}) or {}
-                    if not bool(props.get("hidden", False)):
-                        if ws.title:
-                            titles.append(ws.title)
-            except Exception:
-                titles = [ws.title for ws in sh.worksheets()]
-        return titles
+            return None
+        self._revisions[spreadsheet_id] = (revision, time.monotonic())
+        return revision
+
+    def date_index(self, spreadsheet_id: str, worksheet_title: str) -> Dict[str, set]:
+        """
+        Индекс {дата: {ИНН}} листа (A — ИНН, E — дата). Колонки скачиваются
+        одним запросом и заново — только когда изменилась ревизия таблицы.
+        """
+        key = (spreadsheet_id, worksheet_title)
+        # None — без ревизии не понять, свежий ли индекс, перечитаем
+        revision = self.revision(spreadsheet_id)
+        cached = self._date_indexes.get(key)
+        if cached and revision is not None and cached[0] == revision:
+            return cached[1]
+
+        quoted = worksheet_title.replace("'", "''")
+        resp = self.service.spreadsheet(spreadsheet_id).values_batch_get(
+            [f"'{quoted}'!A:A", f"'{quoted}'!E:E"]
+        )
+        value_ranges = resp.get("valueRanges", [])
+        col_a, col_e = [
+            [row[0] if row else "" for row in vr.get("values", [])]
+            for vr in (value_ranges + [{}, {}])[:2]
+        ]
+
+        index: Dict[str, set] = {}
+        for i in range(1, min(len(col_a), len(col_e))):
+            inn = (col_a[i] or "").strip()
+            date_key = normalize_date(col_e[i])
+            if inn and date_key:
+                index.setdefault(date_key, set()).add(inn)
+        if revision is not None:
+            self._date_indexes[key] = (revision, index)
+        return index
 
     def get_inns_by_date(self, spreadsheet_id: str, worksheet_title: str, date_text: str) -> List[str]:
-        sh = self.gc.open_by_key(spreadsheet_id)
-        ws = sh.worksheet(worksheet_title)
+        index = self.date_index(spreadsheet_id, worksheet_title)
+        return sorted(index.get(normalize_date(date_text), ()))
 
-        col_a = ws.col_values(1)  # INN
-        col_e = ws.col_values(5)  # date
-
-        inns = []
-        for i in range(1, min(len(col_a), len(col_e))):
-            if (col_e[i] or "").strip() == date_text.strip():
-                inn = (col_a[i] or "").strip()
-                if inn:
-                    inns.append(inn)
-        return sorted(set(inns))
+    def flow_index(self, spreadsheet_id: str, worksheet_title: str):
+        """Общий индекс ИНН → ID листа маппинга (inn_index)"""
+        return get_inn_index(self.service_account_path, spreadsheet_id, worksheet_title)
 
     def get_flow_id_by_inn(self, spreadsheet_id: str, worksheet_title: str, inn: str) -> Optional[str]:
-        sh = self.gc.open_by_key(spreadsheet_id)
-        ws = sh.worksheet(worksheet_title)
-
-        col_a = ws.col_values(1)  # INN
-        col_b = ws.col_values(2)  # ID
-        inn = inn.strip()
-        for i in range(1, min(len(col_a), len(col_b))):
-            if (col_a[i] or "").strip() == inn:
-                flow_id = (col_b[i] or "").strip()
-                return flow_id if flow_id else None
-        return None
+        # Общий индекс ИНН → ID вместо прохода по колонкам на каждый ИНН
+        return get_inn_index(self.service_account_path, spreadsheet_id, worksheet_title).get(inn)
 
 
 # ===========================
@@ -433,6 +477,27 @@ class DaDataWorker(QThread):
             self.failed.emit(str(e))
 
 
+class FlowIndexWorker(QThread):
+    """Загрузка маппинга ИНН → ID в фоне, чтобы клик по ИНН не ждал сеть"""
+    loaded = Signal(int)
+    failed = Signal(str)
+
+    def __init__(self, index_service, force: bool = False):
+        super().__init__()
+        self.index_service = index_service
+        self.force = force
+
+    def run(self):
+        try:
+            if self.force:
+                index = self.index_service.load()
+            else:
+                index = self.index_service.index()
+            self.loaded.emit(len(index))
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
 # ===========================
 # PLAYWRIGHT PARSING
 # ===========================
@@ -486,7 +551,7 @@ def extract_notes_text(page) -> str:
     return loc.first.input_value() or ""
 
 
-def _playwright_fetch_in_process(profile_dir: str, url: str, out_q: mp.Queue, login: str = "", password: str = "") -> None:
+def _playwright_fetch_in_process(profile_dir: str, url: str, out_q: mp.Queue, login: str = "", password: str = "", block: Optional[dict] = None) -> None:
     """Безопасный парсинг с Playwright"""
     try:
         with sync_playwright() as p:
@@ -527,6 +592,7 @@ def _playwright_fetch_in_process(profile_dir: str, url: str, out_q: mp.Queue, lo
                 user_data_dir=str(user_data_dir),
                 headless=True,
             )
+            apply_to_playwright(ctx, block)
             page = ctx.new_page()
             page.goto(url, wait_until="domcontentloaded")
 
@@ -551,6 +617,7 @@ def _playwright_fetch_in_process(profile_dir: str, url: str, out_q: mp.Queue, lo
                         user_data_dir=str(user_data_dir),
                         headless=False,
                     )
+                    apply_to_playwright(ctx, block)
                     page = ctx.new_page()
                     page.goto(url, wait_until="domcontentloaded")
                     try:
@@ -570,9 +637,10 @@ def _playwright_fetch_in_process(profile_dir: str, url: str, out_q: mp.Queue, lo
                     pass
                 page.wait_for_timeout(1200)
 
+            stats = playwright_page_stats(page)
             ctx.close()
 
-        out_q.put({"ok": True, "leaders": leaders, "notes": notes})
+        out_q.put({"ok": True, "leaders": leaders, "notes": notes, "stats": stats})
     except Exception as e:
         out_q.put({"ok": False, "error": str(e)})
 
@@ -582,13 +650,15 @@ class FlowFetchWorker(QThread):
     loaded = Signal(list, str)  # leaders, notes_text
     failed = Signal(str)
 
-    def __init__(self, profile_dir: str, url: str, login: str = "", password: str = "", process_timeout_sec: int = 180):
+    def __init__(self, profile_dir: str, url: str, login: str = "", password: str = "", process_timeout_sec: int = 180, block: Optional[dict] = None):
         super().__init__()
         self.profile_dir = profile_dir
         self.url = url
         self.login = login
         self.password = password
         self.process_timeout_sec = process_timeout_sec
+        self.block = block
+        self.page_stats: Dict = {}
 
     def run(self):
         try:
@@ -597,7 +667,7 @@ class FlowFetchWorker(QThread):
             else:
                 self.status.emit("Загрузка user_flow… (если нужна авторизация — откроется окно браузера)")
             q: mp.Queue = mp.Queue()
-            p = mp.Process(target=_playwright_fetch_in_process, args=(self.profile_dir, self.url, q, self.login, self.password))
+            p = mp.Process(target=_playwright_fetch_in_process, args=(self.profile_dir, self.url, q, self.login, self.password, self.block))
             p.start()
             p.join(timeout=self.process_timeout_sec)
 
@@ -615,6 +685,7 @@ class FlowFetchWorker(QThread):
                 result = {"ok": False, "error": "Не удалось получить результат Playwright (пустой ответ)."}
 
             if result.get("ok"):
+                self.page_stats = result.get("stats") or {}
                 self.loaded.emit(result.get("leaders", []), result.get("notes", ""))
             else:
                 self.failed.emit(result.get("error") or "Неизвестная ошибка Playwright")
@@ -1129,6 +1200,9 @@ class GreetingTab(QWidget):
         super().__init__()
         self.config = config
         self.sheets = None
+        self._index_worker = None
+        # ИНН, ожидающий загрузки маппинга
+        self._pending_inn: Optional[str] = None
         
         self._leaders: List[LeaderRow] = []
         self._notes_text: str = ""
@@ -1212,6 +1286,16 @@ class GreetingTab(QWidget):
         self.open_flow_btn.clicked.connect(self.on_open_flow)
         info_layout.addWidget(self.open_flow_btn)
         
+        index_row = QHBoxLayout()
+        self.index_label = QLabel("Маппинг ИНН → ID: —")
+        self.index_label.setStyleSheet("color: #9e9e9e;")
+        index_row.addWidget(self.index_label, 1)
+        self.refresh_index_btn = QPushButton("Обновить ID")
+        self.refresh_index_btn.setToolTip("Перечитать лист маппинга ИНН → ID")
+        self.refresh_index_btn.clicked.connect(lambda: self.load_flow_index(force=True))
+        index_row.addWidget(self.refresh_index_btn)
+        info_layout.addLayout(index_row)
+        
         info_group.setLayout(info_layout)
         left_layout.addWidget(info_group)
         
@@ -1323,6 +1407,8 @@ class GreetingTab(QWidget):
             if Path(sa_file).exists():
                 self.sheets = SheetsClient(sa_file)
                 self.set_status("Google Sheets клиент инициализирован ✅")
+                # Маппинг грузим заранее — к первому клику он уже в памяти
+                self.load_flow_index()
             else:
                 self.set_status(f"⚠️ Файл {sa_file} не найден")
         except Exception as e:
@@ -1396,39 +1482,97 @@ class GreetingTab(QWidget):
         inn = item.text().strip()
         self.selected_inn_label.setText(f"ИНН: {inn}")
         
-        # Получение flow_id
-        try:
-            sheet_map_id = self.config.get("sheet_map_id", "")
-            sheet_map_tab = self.config.get("sheet_map_tab", "Айди")
-            
-            if not sheet_map_id:
-                QMessageBox.warning(self, "Ошибка", "Не указан sheet_map_id в настройках (Ctrl+H)")
-                return
-            
-            flow_id = self.sheets.get_flow_id_by_inn(sheet_map_id, sheet_map_tab, inn)
+        if not self.config.get("sheet_map_id", ""):
+            QMessageBox.warning(self, "Ошибка", "Не указан sheet_map_id в настройках (Ctrl+H)")
+            return
+        
+        self.resolve_flow_id(inn)
+    
+    def flow_index(self):
+        """Индекс ИНН → ID из настроек или None"""
+        sheet_map_id = self.config.get("sheet_map_id", "")
+        if not self.sheets or not sheet_map_id:
+            return None
+        return self.sheets.flow_index(sheet_map_id, self.config.get("sheet_map_tab", "Айди"))
+    
+    def load_flow_index(self, force: bool = False):
+        """Загрузка (force — перечитывание) маппинга ИНН → ID в фоне"""
+        index = self.flow_index()
+        if index is None:
+            return
+        if self._index_worker and self._index_worker.isRunning():
+            # Результат текущей загрузки разрешит и ожидающий ИНН
+            return
+        
+        self.refresh_index_btn.setEnabled(False)
+        self.index_label.setText("Маппинг ИНН → ID: загрузка...")
+        worker = FlowIndexWorker(index, force)
+        worker.loaded.connect(self.on_flow_index_loaded)
+        worker.failed.connect(self.on_flow_index_failed)
+        self._index_worker = worker
+        worker.start()
+    
+    def on_flow_index_loaded(self, count: int):
+        self.refresh_index_btn.setEnabled(True)
+        self.index_label.setText(f"Маппинг ИНН → ID: {count} ИНН, обновлён {datetime.now():%H:%M}")
+        inn, self._pending_inn = self._pending_inn, None
+        if inn:
+            self.resolve_flow_id(inn, reload_missing=False)
+    
+    def on_flow_index_failed(self, err: str):
+        self.refresh_index_btn.setEnabled(True)
+        self.index_label.setText("Маппинг ИНН → ID: ошибка загрузки")
+        if self._pending_inn:
+            self._pending_inn = None
+            self.flow_id_label.setText("ID: —")
+            QMessageBox.warning(self, "Ошибка", f"Не удалось получить flow_id:\n{err}")
+        else:
+            self.set_status(f"⚠️ Не удалось загрузить маппинг ИНН → ID: {err}")
+    
+    def resolve_flow_id(self, inn: str, reload_missing: bool = True):
+        """Поиск flow_id в индексе в памяти; сеть — только в фоне"""
+        index = self.flow_index()
+        if index is None:
+            return
+        
+        current = index.peek()
+        if current is None:
+            # Маппинг ещё грузится — ответим, когда загрузится
+            self._pending_inn = inn
+            self.flow_id_label.setText("ID: загрузка маппинга...")
+            self.open_flow_btn.setEnabled(False)
+            self.load_flow_index()
+            return
+        
+        flow_id = current.get(inn)
+        if flow_id:
+            self.flow_id_label.setText(f"ID: {flow_id}")
+            self.open_flow_btn.setEnabled(True)
+            self._current_flow_id = flow_id
+            self._current_inn = inn
             
-            if flow_id:
-                self.flow_id_label.setText(f"ID: {flow_id}")
-                self.open_flow_btn.setEnabled(True)
-                self._current_flow_id = flow_id
-                self._current_inn = inn
-                
-                # Автоматически получить название через DaData
-                self.fetch_org_name(inn)
-            else:
-                self.flow_id_label.setText("ID: не найден")
-                self.open_flow_btn.setEnabled(False)
-                QMessageBox.warning(
-                    self, 
-                    "Не найден", 
-                    f"Flow ID для ИНН {inn} не найден в таблице маппинга.\n\n"
-                    f"Проверьте:\n"
-                    f"- sheet_map_id: {sheet_map_id}\n"
-                    f"- sheet_map_tab: {sheet_map_tab}"
-                )
-                
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка", f"Не удалось получить flow_id:\n{e}")
+            # Автоматически получить название через DaData
+            self.fetch_org_name(inn)
+            return
+        
+        self.open_flow_btn.setEnabled(False)
+        age = index.age() or 0
+        if reload_missing and age > FLOW_INDEX_MISS_RELOAD_SECONDS:
+            # ИНН мог появиться в таблице после загрузки — перечитываем один раз
+            self._pending_inn = inn
+            self.flow_id_label.setText("ID: обновление маппинга...")
+            self.load_flow_index(force=True)
+            return
+        
+        self.flow_id_label.setText("ID: не найден")
+        QMessageBox.warning(
+            self, 
+            "Не найден", 
+            f"Flow ID для ИНН {inn} не найден в таблице маппинга.\n\n"
+            f"Проверьте:\n"
+            f"- sheet_map_id: {self.config.get('sheet_map_id', '')}\n"
+            f"- sheet_map_tab: {self.config.get('sheet_map_tab', 'Айди')}"
+        )
     
     def fetch_org_name(self, inn: str):
         """Получение названия организации через DaData"""
@@ -1469,7 +1613,7 @@ class GreetingTab(QWidget):
         self.set_status("Запуск Playwright...")
         self.open_flow_btn.setEnabled(False)
         
-        worker = FlowFetchWorker(profile_dir, url, login, password)
+        worker = FlowFetchWorker(profile_dir, url, login, password, block=block_profile(self.config))
         
         def on_status(msg: str):
             self.set_status(msg)
@@ -1482,7 +1626,9 @@ class GreetingTab(QWidget):
             self.populate_leaders_table()
             self.generate_btn.setEnabled(True)
             self.open_flow_btn.setEnabled(True)
-            self.set_status(f"Загружено {len(leaders)} руководителей ✅")
+            page_stats = format_page_stats(worker.page_stats)
+            suffix = f" ({page_stats})" if page_stats else ""
+            self.set_status(f"Загружено {len(leaders)} руководителей ✅{suffix}")
         
         def on_failed(err: str):
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить данные:\n{err}")
@@ -1687,6 +1833,12 @@ class GreetingTab(QWidget):
             except:
                 pass
         
+        if self._index_worker:
+            try:
+                self._index_worker.wait(3000)
+            except:
+                pass
+        
         if hasattr(self, '_flow_worker'):
             try:
                 self._flow_worker.quit()
@@ -9,10 +9,12 @@ import sys
 import time
 from pathlib import Path
 
-import gspread
-from google.oauth2.service_account import Credentials
 from playwright.sync_api import sync_playwright
 
+from resource_blocking import block_profile, apply_to_playwright, playwright_page_stats, LoadStats
+from sheets_service import get_service
+from inn_index import get_inn_index
+
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QLineEdit, QGroupBox, QFormLayout, QMessageBox,
@@ -57,6 +59,7 @@ class ObrezkaWorker(QThread):
         self._is_running = True
         self._is_paused = False
         self.stats = {"ok": 0, "err": 0, "skip": 0}
+        self.load_stats = LoadStats()
         
         self.play = None
         self.ctx = None
@@ -103,6 +106,7 @@ class ObrezkaWorker(QThread):
                 if self.settings["delay"] > 0:
                     time.sleep(self.settings["delay"])
             
+            self.log.emit(f"📦 {self.load_stats.summary()}")
             self.log.emit("✅ Обработка завершена")
         except Exception as e:
             self.log.emit(f"FATAL ERROR: {str(e)}")
@@ -121,6 +125,7 @@ class ObrezkaWorker(QThread):
                 headless=self.settings["headless"],
                 viewport={"width": 1280, "height": 800}
             )
+            apply_to_playwright(self.ctx, block_profile(self.config))
             self.page = self.ctx.new_page()
             
             # Проверка авторизации
@@ -196,6 +201,7 @@ class ObrezkaWorker(QThread):
             
             try:
                 self.page.goto(target_url, timeout=45000, wait_until="domcontentloaded")
+                self.load_stats.add(playwright_page_stats(self.page))
                 
                 if not self.ensure_logged_in(return_url=target_url):
                     return False
@@ -455,28 +461,18 @@ class ObrezkaTab(QWidget):
         tab_inn = "Молодняк"
         tab_map = "Айди"
         
-        creds = Credentials.from_service_account_file(
-            service_account,
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets.readonly",
-                "https://www.googleapis.com/auth/drive.readonly",
-            ]
-        )
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(sheet_id)
+        # Клиент и листы — общие на процесс
+        service = get_service(service_account)
         
         # Чтение ИНН
-        inns = sh.worksheet(tab_inn).col_values(1)
+        inns = service.worksheet(sheet_id, tab_inn).col_values(1)
         inns = [i.strip() for i in inns if i.strip()]
         if inns and not inns[0].isdigit():
             inns = inns[1:]
         
-        # Чтение маппинга
-        ws = sh.worksheet(tab_map)
-        mapping = {}
-        for i, d in zip(ws.col_values(1), ws.col_values(2)):
-            if i and d:
-                mapping[i.strip()] = d.strip()
+        # Маппинг ИНН → ID — общий индекс; перед заданием перечитываем,
+        # чтобы были видны только что добавленные строки
+        mapping = get_inn_index(service_account, sheet_id, tab_map).load()
         
         # Обработанные ИНН
         processed = set()
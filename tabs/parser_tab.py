@@ -15,14 +15,16 @@ from PyQt5.QtWidgets import (
     QTableWidget,
     QTableWidgetItem,
     QCheckBox,
+    QSpinBox,
     QLineEdit,
     QMessageBox,
     QProgressBar,
     QPlainTextEdit,
     QGroupBox,
     QFormLayout,
+    QApplication,
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal as Signal
+from PyQt5.QtCore import Qt, QThread, QSettings, QTimer, QItemSelectionModel, pyqtSignal as Signal
 
 # Локальные импорты
 import sys
@@ -30,84 +32,126 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from google_api import GoogleSheetsAPI
-from scraper import Scraper
+from scraper import ScraperPool, RECYCLE_EVERY, MEMORY_LIMIT_MB
+from parser_checkpoint import JobCheckpoint
+from metrics_history import MetricsHistory
+from sheet_snapshot import SnapshotStore
+from resource_blocking import block_profile
+from parser_pipeline import (
+    ParserJob,
+    ALLOWED_SHEETS,
+    SHEET_FILTER_PRESETS,
+    sheet_filters,
+    group_flow_tasks,
+    read_current_values,
+    order_by_staleness,
+    describe_staleness,
+    verify_targets,
+)
+
+
+# Таблице вкладки нужна только колонка ИНН (без заголовка): метрики и подкрепы
+# листа не скачиваются ни при переключении листов, ни при сверке снимка
+TABLE_CELLS = "A2:A"
+TABLE_FIRST_ROW = 2
 
 
 class ParserWorker(QThread):
-    """Рабочий поток для обработки ИНН"""
+    """Рабочий поток для обработки ИНН (ParserJob из parser_pipeline)"""
     log = Signal(str)
     progress = Signal(int, int)  # current, total
     finished = Signal()
     
-    def __init__(self, scraper, gs, tasks, sheet_name, row_map, filters):
+    def __init__(self, pool, gs, tasks, **job_options):
         super().__init__()
-        self.scraper = scraper
-        self.gs = gs
-        self.tasks = tasks
-        self.sheet_name = sheet_name
-        self.row_map = row_map
-        self.filters = filters
-        self._is_running = True
+        self.job = ParserJob(
+            pool, gs, tasks,
+            log=self.log.emit, progress=self.progress.emit,
+            **job_options,
+        )
     
     def stop(self):
-        self._is_running = False
+        self.job.stop()
     
     def run(self):
         try:
-            for done, (gui_row, inn, ufid) in enumerate(self.tasks, start=1):
-                if not self._is_running:
-                    self.log.emit("⏹ Остановлено пользователем")
-                    break
-                    
-                self.log.emit("-" * 40)
-                self.log.emit(f"[ИНН {inn}] user_flow_id={ufid}")
-                
-                data = self.scraper.process_record(inn, ufid, self.filters)
-                
-                gs_row = self.row_map[gui_row]
-                
-                self.log.emit(
-                    f"[ИНН {inn}] total={data['total']} rich={data['rich']} "
-                    f"filtered={data['filtered']} himera={data['himera_finance']} "
-                    f"old_no_delay={data['old_without_delay']}"
-                )
-                
-                # Записываем в Google Sheets
-                self.gs.update_row_metrics(
-                    self.sheet_name,
-                    gs_row,
-                    data['total'],
-                    data['rich'],
-                    data['filtered'],
-                    data['himera_finance'],
-                    data['old_without_delay']
-                )
-                
-                supports_text = "\n".join(data["supports"]) if data["supports"] else "Нет подкрепов"
-                self.gs.update_supports(self.sheet_name, gs_row, supports_text)
-                
-                self.log.emit(f"[ИНН {inn}] записано в строку {gs_row}")
-                
-                self.progress.emit(done, len(self.tasks))
-                
-            self.log.emit("Готово ✔")
-        except Exception as e:
-            self.log.emit(f"ОШИБКА: {str(e)}")
+            self.job.run()
         finally:
             self.finished.emit()
 
 
+class SnapshotSyncWorker(QThread):
+    """Сверка локального снимка с таблицей в фоне"""
+    synced = Signal(object, object)  # все листы, изменившиеся листы
+    failed = Signal(str)
+    
+    def __init__(self, snapshot, gs):
+        super().__init__()
+        self.snapshot = snapshot
+        self.gs = gs
+    
+    def run(self):
+        try:
+            titles, changed = self.snapshot.sync(self.gs)
+            self.synced.emit(titles, changed)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ScraperLaunchWorker(QThread):
+    """Запуск пула браузеров и вход на сайт в фоне при старте приложения"""
+    log = Signal(str)
+    launched = Signal(object)  # ScraperPool
+    
+    def __init__(self, size, headless, login, password, **pool_options):
+        super().__init__()
+        self.size = size
+        self.headless = headless
+        # block, recycle_every, memory_limit_mb — как у ScraperPool
+        self.pool_options = pool_options
+        self.login = login
+        self.password = password
+    
+    def run(self):
+        pool = None
+        try:
+            pool = ScraperPool(self.size, headless=self.headless, **self.pool_options)
+            pool.login(self.login, self.password)
+            self.log.emit(f"✅ Браузеры запущены заранее: {len(pool)}")
+            self.launched.emit(pool)
+        except Exception as e:
+            if pool:
+                pool.quit()
+            self.log.emit(f"⚠️ Не удалось запустить браузер заранее: {e}")
+
+
 class ParserTab(QWidget):
     def __init__(self, config):
         super().__init__()
         self.config = config
-        self.scraper = None
+        self.pool = None
         self.row_map = []
+        # Выделенные строки по листам ({лист: {строка}}) и ИНН листов
+        # ({лист: {строка: ИНН}}) — для совместного прохода по нескольким листам
+        self.selections = {}
+        self.sheet_inns = {}
+        self.loaded_sheet = None
+        self.history = None
+        # Локальный снимок таблицы и его фоновая сверка
+        self.snapshot = None
+        self.sync_worker = None
+        # Сверку запросили, пока шла предыдущая (например, сменилась таблица)
+        self.sync_again = False
         self.gs = None
         self.worker = None
+        self.launcher = None
+        self.settings = QSettings("UnifiedApp", "Settings")
         
         self.init_ui()
         self.load_google_sheets()
+        self.prelaunch_scraper()
+        # После показа окна: продолжить задание, прерванное в прошлый раз
+        QTimer.singleShot(0, self.offer_resume)
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -124,11 +168,12 @@ class ParserTab(QWidget):
         sheet_layout = QVBoxLayout()
         
         self.sheet_combo = QComboBox()
+        self.sheet_combo.currentIndexChanged.connect(lambda _: self.load_table())
         sheet_layout.addWidget(QLabel("Лист:"))
         sheet_layout.addWidget(self.sheet_combo)
         
         btn_refresh = QPushButton("🔄 Обновить")
-        btn_refresh.clicked.connect(self.load_table)
+        btn_refresh.clicked.connect(self.refresh_table)
         sheet_layout.addWidget(btn_refresh)
         
         sheet_group.setLayout(sheet_layout)
@@ -184,9 +229,9 @@ class ParserTab(QWidget):
         filters_layout.addLayout(dep_layout)
         
         filters_layout.addWidget(QLabel("<b>Отложки:</b>"))
-        info_label = QLabel("По умолчанию: 2 месяца + ошибки")
-        info_label.setStyleSheet("font-style: italic; color: gray;")
-        filters_layout.addWidget(info_label)
+        self.cb_ready_2months = QCheckBox("2 месяца + ошибки")
+        self.cb_ready_2months.setChecked(True)
+        filters_layout.addWidget(self.cb_ready_2months)
         
         filters_group.setLayout(filters_layout)
         right.addWidget(filters_group)
@@ -195,10 +240,72 @@ class ParserTab(QWidget):
         browser_group = QGroupBox("Настройки браузера")
         browser_layout = QVBoxLayout()
         
+        self.cb_all_presets = QCheckBox("Считать G и для других листов за один заход")
+        self.cb_all_presets.setToolTip(
+            "Фильтры других листов берутся из пресетов (config.json → sheet_presets)"
+        )
+        browser_layout.addWidget(self.cb_all_presets)
+        
+        self.cb_multi_sheet = QCheckBox("Выбранные строки со всех листов")
+        self.cb_multi_sheet.setToolTip(
+            "Выделение запоминается для каждого листа. Строки с одним user_flow_id\n"
+            "и одинаковыми фильтрами обрабатываются одним заходом на страницу,\n"
+            "результат пишется во все эти строки."
+        )
+        browser_layout.addWidget(self.cb_multi_sheet)
+        
         self.cb_headless = QCheckBox("Скрывать браузер (headless)")
         self.cb_headless.setChecked(True)
         browser_layout.addWidget(self.cb_headless)
         
+        pool_layout = QHBoxLayout()
+        pool_layout.addWidget(QLabel("Браузеров параллельно:"))
+        self.sb_pool_size = QSpinBox()
+        self.sb_pool_size.setRange(1, 8)
+        self.sb_pool_size.setValue(3)
+        pool_layout.addWidget(self.sb_pool_size)
+        pool_layout.addStretch()
+        browser_layout.addLayout(pool_layout)
+        
+        fresh_layout = QHBoxLayout()
+        self.cb_skip_fresh = QCheckBox("Пропускать обновлённые за, ч:")
+        self.cb_skip_fresh.setToolTip(
+            "Строки, которые уже парсились с теми же фильтрами за последние N часов\n"
+            "(по локальной истории metrics_history.db), не обрабатываются"
+        )
+        self.cb_skip_fresh.setChecked(self.settings.value("parser_skip_fresh", False, type=bool))
+        self.cb_skip_fresh.toggled.connect(
+            lambda checked: self.settings.setValue("parser_skip_fresh", checked)
+        )
+        fresh_layout.addWidget(self.cb_skip_fresh)
+        self.sb_fresh_hours = QSpinBox()
+        self.sb_fresh_hours.setRange(1, 168)
+        self.sb_fresh_hours.setValue(self.settings.value("parser_fresh_hours", 12, type=int))
+        self.sb_fresh_hours.valueChanged.connect(
+            lambda value: self.settings.setValue("parser_fresh_hours", value)
+        )
+        fresh_layout.addWidget(self.sb_fresh_hours)
+        fresh_layout.addStretch()
+        browser_layout.addLayout(fresh_layout)
+        
+        self.cb_stale_first = QCheckBox("Сначала самые устаревшие строки")
+        self.cb_stale_first.setToolTip(
+            "Порядок: строки с пустыми E:H, затем по давности последнего подкрепа (K).\n"
+            "Если прогон прервётся, самое нужное уже будет обновлено."
+        )
+        self.cb_stale_first.setChecked(self.settings.value("parser_stale_first", False, type=bool))
+        self.cb_stale_first.toggled.connect(
+            lambda checked: self.settings.setValue("parser_stale_first", checked)
+        )
+        browser_layout.addWidget(self.cb_stale_first)
+        
+        self.cb_prelaunch = QCheckBox("Запускать браузер при старте приложения")
+        self.cb_prelaunch.setChecked(self.settings.value("parser_prelaunch", False, type=bool))
+        self.cb_prelaunch.toggled.connect(
+            lambda checked: self.settings.setValue("parser_prelaunch", checked)
+        )
+        browser_layout.addWidget(self.cb_prelaunch)
+        
         browser_group.setLayout(browser_layout)
         right.addWidget(browser_group)
         
@@ -216,26 +323,111 @@ class ParserTab(QWidget):
         self.setLayout(main)
     
     def load_google_sheets(self):
-        """Загрузка Google Sheets API"""
+        """
+        Загрузка Google Sheets API. Листы и таблица сразу берутся из
+        локального снимка, ревизия таблицы сверяется в фоне.
+        """
         try:
             service_account = self.config.get("service_account_file", "service_account.json")
             spreadsheet_id = self.config.get("spreadsheet_id", "1U5LgHZMljA7DdjtxXCTaUB-GmK4uyxXCo5Io4pSScQk")
             
+            previous_id = self.gs.spreadsheet_id if self.gs else None
             self.gs = GoogleSheetsAPI(service_account, spreadsheet_id)
+            if previous_id is not None and previous_id != spreadsheet_id:
+                # Другая таблица: строки, выделение и ИНН старой к ней не относятся
+                self.loaded_sheet = None
+                self.selections = {}
+                self.sheet_inns = {}
+                self.row_map = []
+                self.table.setRowCount(0)
+            if self.snapshot is None:
+                self.snapshot = SnapshotStore(cells=TABLE_CELLS)
             
-            allowed = ["1кк", "500к", "0", "2кк дальняк", "У чатеров"]
-            sheets = [s for s in self.gs.get_sheet_names() if s in allowed]
-            self.sheet_combo.clear()
-            self.sheet_combo.addItems(sheets)
-            self.sheet_combo.currentIndexChanged.connect(self.load_table)
-            
-            self.log("✅ Google Sheets подключен")
-            self.load_table()
+            titles = self.snapshot.titles(spreadsheet_id)
+            if titles is not None:
+                self.fill_sheet_combo(titles)
+                if self.loaded_sheet is None and self.sheet_combo.currentText():
+                    # Те же названия листов — fill_sheet_combo таблицу не перечитал
+                    self.load_table()
+                self.log("✅ Google Sheets: данные из локального снимка, проверяю обновления...")
+            else:
+                self.log("⏳ Google Sheets: первая загрузка...")
+            self.start_snapshot_sync()
         except Exception as e:
             self.log(f"❌ Ошибка подключения к Google Sheets: {str(e)}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось подключиться к Google Sheets:\n{str(e)}")
     
-    def load_table(self):
+    def fill_sheet_combo(self, titles):
+        """Разрешённые листы в списке; текущий лист сохраняется"""
+        sheets = [s for s in titles if s in ALLOWED_SHEETS]
+        current = self.sheet_combo.currentText()
+        if sheets == [self.sheet_combo.itemText(i) for i in range(self.sheet_combo.count())]:
+            return False
+        self.sheet_combo.blockSignals(True)
+        self.sheet_combo.clear()
+        self.sheet_combo.addItems(sheets)
+        if current in sheets:
+            self.sheet_combo.setCurrentIndex(sheets.index(current))
+        self.sheet_combo.blockSignals(False)
+        if self.sheet_combo.currentText() != self.loaded_sheet:
+            self.load_table()
+        return True
+    
+    def start_snapshot_sync(self):
+        if self.sync_worker and self.sync_worker.isRunning():
+            # Текущая сверка может быть для прежней таблицы — повторим после неё
+            self.sync_again = True
+            return
+        self.sync_again = False
+        gs = self.gs
+        self.sync_worker = SnapshotSyncWorker(self.snapshot, gs)
+        self.sync_worker.synced.connect(
+            lambda titles, changed: self.on_snapshot_synced(titles, changed, gs)
+        )
+        self.sync_worker.failed.connect(
+            lambda e: self.log(f"⚠️ Не удалось проверить обновления таблицы: {e}")
+        )
+        self.sync_worker.finished.connect(self.on_snapshot_sync_finished)
+        self.sync_worker.start()
+    
+    def on_snapshot_sync_finished(self):
+        if self.sync_again:
+            self.sync_worker.wait()
+            self.start_snapshot_sync()
+    
+    def on_snapshot_synced(self, titles, changed, gs=None):
+        """Фоновая сверка закончилась: перерисовываем только то, что изменилось"""
+        if gs is not None and gs is not self.gs:
+            # Результат для таблицы, которую уже сменили в настройках
+            return
+        self.fill_sheet_combo(titles)
+        if changed:
+            self.log(f"🔄 Обновлены листы: {', '.join(changed)}")
+        sheet = self.sheet_combo.currentText()
+        if sheet in changed or (sheet and sheet != self.loaded_sheet):
+            self.load_table()
+        elif not changed:
+            self.log("✅ Google Sheets: снимок актуален")
+    
+    def refresh_table(self):
+        """«Обновить»: перечитать и список листов, и сам лист"""
+        if self.gs:
+            self.gs.refresh()
+        self.load_table(fresh=True)
+    
+    def sheet_rows(self, sheet, fresh=False):
+        """
+        Колонка ИНН листа (TABLE_CELLS, с TABLE_FIRST_ROW): из снимка,
+        если он есть, иначе из таблицы (и в снимок)
+        """
+        sid = self.gs.spreadsheet_id
+        rows = None if fresh else self.snapshot.values(sid, sheet)
+        if rows is None:
+            rows = self.gs.get_sheets_values([sheet], TABLE_CELLS).get(sheet, [])
+            self.snapshot.put_values(sid, sheet, rows)
+        return rows
+    
+    def load_table(self, fresh=False):
         """Загрузка таблицы с ИНН"""
         if not self.gs:
             return
@@ -244,9 +436,12 @@ class ParserTab(QWidget):
             sheet = self.sheet_combo.currentText()
             if not sheet:
                 return
+            
+            # Запоминаем выделение листа, с которого уходим
+            if self.loaded_sheet:
+                self.selections[self.loaded_sheet] = self.selected_sheet_rows()
                 
-            ws = self.gs.get_sheet(sheet)
-            rows = ws.get_all_values()
+            rows = self.sheet_rows(sheet, fresh)
             
             # Для листа "0" отключаем минимальный депозит
             if sheet == "0":
@@ -260,9 +455,7 @@ class ParserTab(QWidget):
             self.row_map = []
             inns = []
             
-            for idx, row in enumerate(rows, start=1):
-                if idx == 1:  # Пропускаем заголовок
-                    continue
+            for idx, row in enumerate(rows, start=TABLE_FIRST_ROW):
                 if not row:
                     continue
                 
@@ -278,10 +471,31 @@ class ParserTab(QWidget):
             for i, inn in enumerate(inns):
                 self.table.setItem(i, 0, QTableWidgetItem(inn))
             
+            self.loaded_sheet = sheet
+            self.sheet_inns[sheet] = dict(zip(self.row_map, inns))
+            self.restore_selection(self.selections.get(sheet, set()))
+            
             self.log(f"Загружен лист '{sheet}'. Найдено ИНН: {len(inns)}")
         except Exception as e:
             self.log(f"❌ Ошибка загрузки таблицы: {str(e)}")
     
+    def selected_sheet_rows(self):
+        """Номера строк листа, выделенных в таблице"""
+        return {
+            self.row_map[i.row()]
+            for i in self.table.selectedIndexes()
+            if i.row() < len(self.row_map)
+        }
+    
+    def restore_selection(self, rows):
+        model = self.table.selectionModel()
+        for i, gs_row in enumerate(self.row_map):
+            if gs_row in rows:
+                model.select(
+                    self.table.model().index(i, 0),
+                    QItemSelectionModel.Select | QItemSelectionModel.Rows,
+                )
+    
     def get_filters(self):
         """Получение фильтров"""
         min_dep = None
@@ -292,15 +506,84 @@ class ParserTab(QWidget):
                 min_dep = None
         
         return {
+            "ready_2months": self.cb_ready_2months.isChecked(),
             "old": self.cb_old.isChecked(),
             "without_notes": self.cb_without_notes.isChecked(),
             "min_deposit": min_dep,
         }
     
+    def get_presets(self, cur_sheet):
+        """Пресеты фильтров других листов: [(лист, фильтры)]"""
+        presets = self.config.get("sheet_presets") or SHEET_FILTER_PRESETS
+        available = [self.sheet_combo.itemText(i) for i in range(self.sheet_combo.count())]
+        return [
+            (sheet, self.sheet_filters(sheet))
+            for sheet in presets
+            if sheet != cur_sheet and sheet in available
+        ]
+    
+    def sheet_filters(self, sheet):
+        """Фильтры листа из пресета; без пресета — фильтры из интерфейса"""
+        presets = self.config.get("sheet_presets") or SHEET_FILTER_PRESETS
+        return sheet_filters(self.get_filters(), sheet, presets)
+    
+    def build_tasks(self, selection, mapping, cur_sheet):
+        """Задачи ParserWorker: по заходу на каждый user_flow_id и набор фильтров"""
+        tasks, missing = group_flow_tasks(
+            selection, self.sheet_inns, mapping,
+            lambda sheet: self.get_filters() if sheet == cur_sheet else self.sheet_filters(sheet),
+        )
+        for inn in missing:
+            self.log(f"[ИНН {inn}] Не найден user_flow_id")
+        return tasks
+    
+    def prelaunch_scraper(self):
+        """Фоновый запуск и вход, чтобы первый «Обработать» не ждал Chrome"""
+        if not self.cb_prelaunch.isChecked() or self.pool is not None:
+            return
+        login = self.config.get("login", "").strip()
+        password = self.config.get("password", "").strip()
+        if not login or not password:
+            return
+        
+        self.log("🌐 Фоновый запуск браузера...")
+        self.launcher = ScraperLaunchWorker(
+            self.sb_pool_size.value(), self.cb_headless.isChecked(), login, password,
+            **self.pool_options(),
+        )
+        self.launcher.log.connect(self.log)
+        self.launcher.launched.connect(self.on_prelaunched)
+        self.launcher.start()
+    
+    def pool_options(self):
+        """Блокировка ресурсов и перезапуск браузеров из config.json"""
+        return {
+            "block": block_profile(self.config),
+            "recycle_every": int(self.config.get("recycle_every", RECYCLE_EVERY)),
+            "memory_limit_mb": int(self.config.get("memory_limit_mb", MEMORY_LIMIT_MB)),
+        }
+    
+    def on_prelaunched(self, pool):
+        """Пул из фонового запуска"""
+        if self.pool is None:
+            self.pool = pool
+        else:
+            pool.quit()
+    
     def ensure_scraper(self):
-        """Создание scraper если его нет"""
-        if self.scraper is None:
-            self.scraper = Scraper(headless=self.cb_headless.isChecked())
+        """Создание пула браузеров, если его нет или изменились настройки"""
+        if self.launcher and self.launcher.isRunning():
+            self.log("⏳ Ждём фоновый запуск браузера...")
+            self.launcher.wait()
+            # launched доставляется через очередь событий — забираем пул сразу
+            QApplication.processEvents()
+        size = self.sb_pool_size.value()
+        headless = self.cb_headless.isChecked()
+        if self.pool is not None and (len(self.pool) != size or self.pool.headless != headless):
+            self.pool.quit()
+            self.pool = None
+        if self.pool is None:
+            self.pool = ScraperPool(size, headless=headless, **self.pool_options())
     
     def process_inns(self):
         """Обработка выбранных ИНН"""
@@ -308,8 +591,14 @@ class ParserTab(QWidget):
             QMessageBox.warning(self, "Внимание", "Обработка уже запущена")
             return
         
-        selected_rows = sorted({i.row() for i in self.table.selectedIndexes()})
-        if not selected_rows:
+        cur_sheet = self.sheet_combo.currentText()
+        self.selections[cur_sheet] = self.selected_sheet_rows()
+        selection = {cur_sheet: self.selections[cur_sheet]}
+        if self.cb_multi_sheet.isChecked():
+            for sheet, rows in self.selections.items():
+                if sheet != cur_sheet and rows:
+                    selection[sheet] = rows
+        if not any(selection.values()):
             QMessageBox.warning(self, "Ошибка", "Выберите строки для обработки")
             return
         
@@ -326,31 +615,192 @@ class ParserTab(QWidget):
             return
         
         # Получение маппинга ИНН -> user_flow_id
-        mapping = self.gs.get_inn_id_mapping()
-        tasks = []
-        
-        for gui_row in selected_rows:
-            inn_item = self.table.item(gui_row, 0)
-            if not inn_item:
-                continue
-            
-            inn = inn_item.text().strip()
-            if inn in mapping:
-                tasks.append((gui_row, inn, mapping[inn]))
-            else:
-                self.log(f"[ИНН {inn}] Не найден user_flow_id")
+        mapping = self.gs.get_inn_id_mapping(fresh=True)
+        tasks = self.build_tasks(selection, mapping, cur_sheet)
         
         if not tasks:
             QMessageBox.warning(self, "Ошибка", "Нет user_flow_id для выбранных ИНН")
             return
         
+        if self.cb_skip_fresh.isChecked():
+            tasks = self.skip_fresh(tasks, self.sb_fresh_hours.value())
+            if not tasks:
+                QMessageBox.information(self, "Готово", "Все выбранные строки уже обновлены")
+                return
+        
+        # Таблица на экране могла быть из снимка — номера строк сверяем с листом
+        tasks = self.verify_tasks(tasks, mapping)
+        if tasks is None:
+            return
+        
+        current_values = None
+        if self.cb_stale_first.isChecked():
+            try:
+                current_values = read_current_values(self.gs, tasks)
+                tasks = order_by_staleness(tasks, current_values)
+                self.show_order(tasks, current_values)
+            except Exception as e:
+                self.log(f"⚠️ Не удалось прочитать таблицу для сортировки, порядок как выделено: {e}")
+        
+        presets, preset_rows = [], {}
+        if self.cb_all_presets.isChecked():
+            presets = self.get_presets(cur_sheet)
+            try:
+                preset_rows = self.gs.get_inn_rows([sheet for sheet, _ in presets])
+                self.log(f"Колонка G также для листов: {', '.join(sheet for sheet, _ in presets)}")
+            except Exception as e:
+                self.log(f"⚠️ Не удалось прочитать другие листы: {e}")
+                presets = []
+        
+        if len(selection) > 1:
+            self.log(f"Листы: {', '.join(sheet for sheet, rows in selection.items() if rows)}")
+        checkpoint = JobCheckpoint.new(cur_sheet, tasks, presets)
+        self.start_job(checkpoint, preset_rows, current_values)
+    
+    def verify_tasks(self, tasks, mapping=None):
+        """
+        Перед запуском: в колонке A целевых строк должен быть тот же ИНН.
+        Несовпавшие строки отбрасываются; None — запускать нельзя.
+        """
+        try:
+            tasks, dropped = verify_targets(self.gs, tasks, mapping)
+        except Exception as e:
+            self.log(f"❌ Не удалось сверить строки с таблицей: {e}")
+            QMessageBox.critical(
+                self, "Ошибка",
+                f"Не удалось проверить, что строки таблицы не сдвинулись:\n{e}\n\nЗапуск отменён."
+            )
+            return None
+        if dropped:
+            self.log(f"⚠️ Строки сдвинулись в таблице, пропущено: {len(dropped)}")
+            for (sheet, gs_row), inn, current in dropped[:20]:
+                self.log(f"  {sheet}:{gs_row} — ожидался ИНН {inn}, в таблице «{current}»")
+            if len(dropped) > 20:
+                self.log(f"  ... ещё {len(dropped) - 20}")
+            # Выделение и номера строк этих листов больше не верны
+            for sheet in {target[0] for target, _, _ in dropped}:
+                self.selections.pop(sheet, None)
+                self.sheet_inns.pop(sheet, None)
+            self.load_table(fresh=True)
+            self.table.clearSelection()
+            self.start_snapshot_sync()
+        if not tasks:
+            QMessageBox.warning(
+                self, "Ошибка",
+                "Выбранные строки изменились в таблице. Таблица перечитана — выберите строки заново."
+            )
+            return None
+        return tasks
+    
+    def skip_fresh(self, tasks, hours):
+        """Убрать задачи, которые уже парсились с теми же фильтрами за hours часов"""
+        history = self.open_history()
+        if history is None:
+            return tasks
+        left = [
+            task for task in tasks
+            if not history.is_fresh(task[1], task[2], task[3], hours)
+        ]
+        skipped = sum(len(task[0]) for task in tasks) - sum(len(task[0]) for task in left)
+        if skipped:
+            self.log(f"⏭ Пропущено строк, обновлённых за {hours} ч: {skipped}")
+        return left
+    
+    def offer_resume(self):
+        """Предложить продолжить задание, прерванное в прошлый запуск"""
+        checkpoint = JobCheckpoint.load()
+        if checkpoint is None or not self.gs:
+            return
+        reply = QMessageBox.question(
+            self,
+            "Незавершённое задание",
+            f"Найдено прерванное задание от {checkpoint.job_id} (лист «{checkpoint.sheet}»).\n"
+            f"Обработано строк: {checkpoint.done_rows} из {checkpoint.total_rows}.\n\n"
+            "Продолжить с необработанных строк?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.No:
+            checkpoint.clear()
+            return
+        
+        if not self.config.get("login", "").strip() or not self.config.get("password", "").strip():
+            QMessageBox.warning(
+                self,
+                "Ошибка",
+                "Не указаны логин и пароль.\n\nОткройте настройки (Ctrl+H) и заполните данные для авторизации."
+            )
+            return
+        
+        # Задание могло пролежать долго — строки в таблице могли сдвинуться
+        try:
+            try:
+                mapping = self.gs.get_inn_id_mapping(fresh=True)
+            except Exception:
+                mapping = None
+            _, dropped = verify_targets(self.gs, checkpoint.pending_tasks(), mapping)
+        except Exception as e:
+            self.log(f"❌ Не удалось сверить строки задания с таблицей: {e}")
+            QMessageBox.critical(
+                self, "Ошибка",
+                f"Не удалось проверить строки задания в таблице:\n{e}\n\n"
+                "Задание сохранено, его можно будет продолжить при следующем запуске."
+            )
+            return
+        if dropped:
+            checkpoint.drop_targets([target for target, _, _ in dropped])
+            self.log(f"⚠️ Строки сдвинулись в таблице, исключено из задания: {len(dropped)}")
+            for (sheet, gs_row), inn, current in dropped[:20]:
+                self.log(f"  {sheet}:{gs_row} — ожидался ИНН {inn}, в таблице «{current}»")
+            if not checkpoint.pending_tasks():
+                checkpoint.clear()
+                QMessageBox.information(
+                    self, "Готово",
+                    "Все необработанные строки задания изменились в таблице — продолжать нечего."
+                )
+                return
+        
+        preset_rows = {}
+        if checkpoint.presets:
+            try:
+                preset_rows = self.gs.get_inn_rows([sheet for sheet, _ in checkpoint.presets])
+            except Exception as e:
+                self.log(f"⚠️ Не удалось прочитать другие листы: {e}")
+                checkpoint.presets = []
+        self.log(f"↻ Продолжение задания {checkpoint.job_id}")
+        self.start_job(checkpoint, preset_rows)
+    
+    def open_history(self):
+        """Локальная история результатов (открывается при первом обращении)"""
+        try:
+            if self.history is None:
+                self.history = MetricsHistory()
+            return self.history
+        except Exception as e:
+            self.log(f"⚠️ История недоступна: {e}")
+            return None
+    
+    def show_order(self, tasks, current_values, limit=50):
+        """Порядок обработки в логе до старта"""
+        self.log("Порядок обработки (сначала самые устаревшие):")
+        for i, task in enumerate(tasks[:limit], start=1):
+            self.log(f"  {i}. ИНН {task[1]} — {describe_staleness(task, current_values)}")
+        if len(tasks) > limit:
+            self.log(f"  ... ещё {len(tasks) - limit}")
+    
+    def start_job(self, checkpoint, preset_rows, current_values=None):
+        """Вход на сайт и запуск ParserWorker по необработанным задачам чекпоинта"""
+        login = self.config.get("login", "").strip()
+        password = self.config.get("password", "").strip()
+        tasks = checkpoint.pending_tasks()
+        presets = checkpoint.presets
+        
         # Создание scraper и вход
         try:
-            self.log("🌐 Запуск браузера...")
+            self.log(f"🌐 Запуск браузеров: {self.sb_pool_size.value()}...")
             self.ensure_scraper()
             
             self.log(f"🔐 Вход на сайт...")
-            self.scraper.login(login, password)
+            self.pool.login(login, password)
             self.log("✅ Авторизация успешна")
         except Exception as e:
             self.log(f"❌ Ошибка входа: {str(e)}")
@@ -363,12 +813,14 @@ class ParserTab(QWidget):
         self.btn_run.setEnabled(False)
         self.btn_stop.setEnabled(True)
         
-        cur_sheet = self.sheet_combo.currentText()
-        filters = self.get_filters()
-        
-        self.log(f"Начало обработки {len(tasks)} строк")
+        rows_total = sum(len(task[0]) for task in tasks)
+        self.log(f"Начало обработки {rows_total} строк, заходов на страницы: {len(tasks)}")
         
-        self.worker = ParserWorker(self.scraper, self.gs, tasks, cur_sheet, self.row_map, filters)
+        self.worker = ParserWorker(
+            self.pool, self.gs, tasks,
+            presets=presets, preset_rows=preset_rows, checkpoint=checkpoint,
+            history=self.open_history(), current_values=current_values,
+        )
         self.worker.log.connect(self.log)
         self.worker.progress.connect(self.update_progress)
         self.worker.finished.connect(self.on_finished)
@@ -405,7 +857,15 @@ class ParserTab(QWidget):
             if self.worker:
                 self.worker.stop()
                 self.worker.wait(3000)
-            if self.scraper:
-                self.scraper.quit()
+            if self.launcher:
+                self.launcher.wait(3000)
+            if self.pool:
+                self.pool.quit()
+            if self.history:
+                self.history.close()
+            if self.sync_worker:
+                self.sync_worker.wait(3000)
+            if self.snapshot:
+                self.snapshot.close()
         except:
             pass
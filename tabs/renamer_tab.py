@@ -4,7 +4,6 @@
 Полный перенос функционала из inn_renamer_tk.py
 """
 
-import re
 import json
 import urllib.parse
 from pathlib import Path
@@ -24,6 +23,10 @@ from PyQt5.QtCore import Qt, QThread, pyqtSignal as Signal
 
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 
+from resource_blocking import block_profile, apply_to_playwright, playwright_page_stats, LoadStats
+from sheets_service import get_service
+from inn_index import get_inn_index, normalize_inn
+
 
 # ===========================
 # КОНСТАНТЫ
@@ -59,11 +62,6 @@ def gsheet_csv_url(spreadsheet_id: str, sheet_name: str) -> str:
     return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/gviz/tq?tqx=out:csv&sheet={urllib.parse.quote(sheet_name)}"
 
 
-def normalize_inn(x):
-    """Нормализация ИНН - только цифры"""
-    return re.sub(r"\D", "", str(x or "").strip())
-
-
 def safe_str(x):
     """Безопасное преобразование в строку"""
     return "" if str(x or "").strip().lower() == "nan" else str(x or "").strip()
@@ -111,12 +109,13 @@ class RenameWorker(QThread):
     progress = Signal(int, int, str, str)  # current, total, inn, flow_id
     finished = Signal(int, int, int)  # ok, skipped, fail
     
-    def __init__(self, email, password, items: List[RowItem], processed_state: dict):
+    def __init__(self, email, password, items: List[RowItem], processed_state: dict, block=None):
         super().__init__()
         self.email = email
         self.password = password
         self.items = items
         self.processed_state = processed_state
+        self.block = block
         self._stop_flag = False
     
     def stop(self):
@@ -142,7 +141,9 @@ class RenameWorker(QThread):
                 # Запуск браузера
                 browser = p.chromium.launch(headless=True)
                 context = browser.new_context()
+                apply_to_playwright(context, self.block)
                 page = context.new_page()
+                load_stats = LoadStats()
                 
                 # Авторизация
                 self.log.emit("🔐 Авторизация на api.itnelep.com...")
@@ -173,6 +174,7 @@ class RenameWorker(QThread):
                     
                     try:
                         page.goto(url, wait_until="domcontentloaded")
+                        load_stats.add(playwright_page_stats(page))
                         
                         # Находим элемент заголовка и кликаем дважды
                         title_span = page.locator('[data-rename-target="title"]').first
@@ -202,6 +204,8 @@ class RenameWorker(QThread):
                         fail += 1
                         self.log.emit(f"❌ {item.inn}: {str(e)}")
                 
+                self.log.emit(f"📦 {load_stats.summary()}")
+                
                 # Закрытие браузера
                 browser.close()
                 self.log.emit("🔒 Браузер закрыт")
@@ -367,6 +371,16 @@ class RenamerTab(QWidget):
     def fetch_sheet_df(self, sheet_name: str) -> pd.DataFrame:
         """Загрузка Google Sheets в DataFrame"""
         spreadsheet_id = self.config.get("spreadsheet_id", "")
+        service_account = self.config.get("service_account_file", "service_account.json")
+        if Path(service_account).exists():
+            # Через общий клиент: лист и метаданные берутся из кэша
+            rows = get_service(service_account).worksheet(spreadsheet_id, sheet_name).get_all_values()
+            if not rows:
+                return pd.DataFrame()
+            width = max(len(r) for r in rows)
+            return pd.DataFrame([r + [""] * (width - len(r)) for r in rows[1:]], dtype=str)
+        
+        # Без ключа сервисного аккаунта — CSV-выгрузка (таблица должна быть открыта по ссылке)
         url = gsheet_csv_url(spreadsheet_id, sheet_name)
         
         r = requests.get(url, timeout=30)
@@ -381,17 +395,25 @@ class RenamerTab(QWidget):
         ids_sheet = self.ids_sheet_edit.text().strip() or SHEET_NAME_IDS_DEFAULT
         
         self.log_msg(f"📥 Загрузка маппинга из листа '{ids_sheet}'...")
-        df_ids = self.fetch_sheet_df(ids_sheet)
-        
-        inn_col_ids = col_letter_to_index("A")
-        id_col_ids = col_letter_to_index("B")
-        
-        inn_to_id = {}
-        for _, row in df_ids.iterrows():
-            inn = normalize_inn(row.iloc[inn_col_ids])
-            fid = safe_str(row.iloc[id_col_ids])
-            if inn and fid:
-                inn_to_id[inn] = fid
+        service_account = self.config.get("service_account_file", "service_account.json")
+        if Path(service_account).exists():
+            # Общий индекс ИНН → ID; перед заданием перечитываем лист,
+            # чтобы были видны только что добавленные строки
+            inn_to_id = get_inn_index(
+                service_account, self.config.get("spreadsheet_id", ""), ids_sheet
+            ).load()
+        else:
+            df_ids = self.fetch_sheet_df(ids_sheet)
+            
+            inn_col_ids = col_letter_to_index("A")
+            id_col_ids = col_letter_to_index("B")
+            
+            inn_to_id = {}
+            for _, row in df_ids.iterrows():
+                inn = normalize_inn(row.iloc[inn_col_ids])
+                fid = safe_str(row.iloc[id_col_ids])
+                if inn and fid:
+                    inn_to_id[inn] = fid
         
         self.log_msg(f"✅ Загружено {len(inn_to_id)} маппингов ИНН→ID")
         
@@ -498,7 +520,10 @@ class RenamerTab(QWidget):
             self.lbl_total.setText(f"0 / {len(items)}")
             
             # Запуск воркера
-            self.worker = RenameWorker(email, password, items, self.processed_state)
+            self.worker = RenameWorker(
+                email, password, items, self.processed_state,
+                block=block_profile(self.config),
+            )
             self.worker.log.connect(self.log_msg)
             self.worker.progress.connect(self.on_progress)
             self.worker.finished.connect(self.on_finished)
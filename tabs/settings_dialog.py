@@ -105,7 +105,9 @@ class SettingsDialog(QDialog):
     
     def get_config(self):
         """Получение обновленной конфигурации"""
-        return {
+        # Ключи, которых нет в диалоге (sheet_presets и т.п.), сохраняем как есть
+        config = dict(self.config)
+        config.update({
             "login": self.login_edit.text(),
             "password": self.password_edit.text(),
             "spreadsheet_id": self.spreadsheet_id_edit.text(),
@@ -116,4 +118,5 @@ class SettingsDialog(QDialog):
             "dadata_token": self.dadata_token_edit.text(),
             "openai_api_key": self.openai_key_edit.text(),
             "credentials_file": self.config.get("credentials_file", "credentials.json")
-        }
+        })
+        return config
@@ -21,6 +21,8 @@ from tabs.renamer_tab import RenamerTab
 from tabs.greeting_tab import GreetingTab
 from tabs.obrezka_tab import ObrezkaTab
 from tabs.settings_dialog import SettingsDialog
+from sheets_service import reset_services
+from inn_index import reset_indexes
 
 
 class UnifiedApp(QMainWindow):
@@ -82,6 +84,9 @@ class UnifiedApp(QMainWindow):
         if dialog.exec_():
             self.config = dialog.get_config()
             self.save_config()
+            # Файл ключей мог смениться — клиенты Google создадутся заново
+            reset_services()
+            reset_indexes()
             # Обновить конфиг во всех вкладках
             self.update_tabs_config()
             QMessageBox.information(self, "Настройки", "Настройки сохранены!")